@@ -2,7 +2,7 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import date, time
+from datetime import date, datetime, time, timedelta
 
 # --- IMPORTAÇÕES MODULARES ---
 import database as db
@@ -12,6 +12,14 @@ from mock_data import gerar_dados_ficticios
 # --- CONFIGURAÇÕES GERAIS ---
 st.set_page_config(page_title="Gestão de Tempo Analytics", layout="wide", page_icon="📊")
 
+# --- AQUECIMENTO DO BANCO ---
+# Dispara antes da senha: o cold start do Neon corre enquanto o usuário digita
+try:
+    db.aquecer_conexao()
+    db.banco_inicializado()  # CREATE/migrações em segundo plano, uma vez por processo
+except Exception:
+    pass
+
 # --- AUTENTICAÇÃO ---
 def check_password():
     def password_entered():
@@ -32,12 +40,6 @@ def check_password():
 if not check_password():
     st.stop()
 
-# --- INICIALIZAÇÃO ---
-try:
-    db.init_db()
-except Exception as e:
-    st.error(f"Erro de conexão: {e}")
-
 # --- SIDEBAR ---
 with st.sidebar:
     st.header("⚙️ Configurações")
@@ -53,6 +55,7 @@ with st.sidebar:
         help="Escolha entre dados reais ou cenários simulados."
     )
     
+    consultas = {}  # Futures das consultas do banco (vazio no modo demo)
     if "Demo" in tipo_dados:
         modo_demo = True
         st.warning(f"⚠️ Visualizando: {tipo_dados}")
@@ -61,7 +64,8 @@ with st.sidebar:
         elif "Déficit" in tipo_dados: cenario_escolhido = "deficit"
         else: cenario_escolhido = "teste_feriado"
         
-        df_bd = gerar_dados_ficticios(cenario_escolhido)
+        versao_bd = None  # dados sorteados a cada execução: sem versão estável
+        livro = ut.Livro(gerar_dados_ficticios(cenario_escolhido))
         # Limpa cache apenas se mudar o cenário
         if "ultimo_cenario" not in st.session_state or st.session_state.ultimo_cenario != cenario_escolhido:
              st.cache_data.clear()
@@ -69,15 +73,39 @@ with st.sidebar:
     else:
         modo_demo = False
         try:
-            df_bd = db.carregar_dados()
+            # Versão, livro, logs e meses saem juntos do pool; cada aba resolve o seu Future.
+            # O livro da versão é montado uma vez por processo e compartilhado pelas sessões
+            consultas = db.consultas_do_rerun()
+            versao_bd = consultas['versao'].result()
+            livro = consultas['livro'].result()
         except Exception as e:
             st.error(f"Erro ao carregar banco: {e}")
-            df_bd = pd.DataFrame()
+            versao_bd = None
+            livro = ut.Livro(pd.DataFrame())
+
+    # Tudo abaixo aponta para o livro compartilhado: a sessão só guarda filtros e o formulário
+    df_bd = livro.bruto
+    indice = livro.indice
+    # Checkpoints mensais: meses fechados não são recalculados no balanço
+    ultimo_fechado, acumulado_fechado = livro.ultimo_fechado, livro.acumulado_fechado
+
+    with st.expander("🧠 Memória"):
+        rss = ut.memoria_processo()
+        if rss is not None:
+            st.caption(f"Processo: **{rss / 2**20:,.0f} MB**")
+        if not modo_demo:
+            compartilhado = db.repositorio_livros().resumo()
+            st.caption(f"Livro compartilhado: **{compartilhado['bytes'] / 2**20:,.1f} MB** "
+                       f"({len(compartilhado['versoes'])} versão(ões) em cache)")
+            figuras = ut.cache_figuras()
+            st.caption(f"Figuras em cache: **{len(figuras)}** ({figuras.bytes_usados / 2**20:,.1f} MB)")
+        st.caption(f"Esta sessão: {len(st.session_state)} chaves de estado (filtros e formulário)")
 
 # --- INTERFACE ---
-tab_lancamento, tab_analytics, tab_auditoria = st.tabs([
+tab_lancamento, tab_analytics, tab_projecao, tab_auditoria = st.tabs([
     "📝 Lançamento & Extrato", 
     "📈 Análise Gerencial (BI)",
+    "🔮 Projeção (E se...)",
     "🕵️ Auditoria (Logs)"
 ])
 
@@ -106,9 +134,15 @@ with tab_lancamento:
             st.session_state.data_ativa = data_sel
 
             # --- CARREGAMENTO DE DADOS (READ) ---
-            rec = pd.DataFrame()
-            if not df_bd.empty:
-                rec = df_bd[df_bd['data'] == str(data_sel)]
+            rec = indice.buscar(data_sel)
+            versao_linha = int(rec.get('versao') or 0) if rec is not None else 0
+
+            # Versão da linha fixada quando o dia é aberto no formulário: se outra
+            # sessão gravar depois disso, o salvamento é recusado (concorrência otimista)
+            if st.session_state.get('form_data') != str(data_sel):
+                st.session_state.form_data = str(data_sel)
+                st.session_state.form_versao = versao_linha
+            versao_form = st.session_state.form_versao
 
             # Defaults (Padrão: Vazio/Zero)
             d_ent, d_sai = time(9,0), time(18,0)
@@ -119,28 +153,36 @@ with tab_lancamento:
 
             # Se encontrou dados no banco, preenche as variáveis (Lógica de Edição)
             modo_edicao = False
-            if not rec.empty:
+            if rec is not None:
                 modo_edicao = True
                 st.info(f"✏️ Editando dados carregados de: {data_sel.strftime('%d/%m/%Y')}")
                 
-                d_obs = rec.iloc[0]['obs']
-                e_str, s_str = rec.iloc[0]['entrada'], rec.iloc[0]['saida']
+                d_obs = rec.get('obs')
                 
-                if e_str == "00:00:00" and s_str == "00:00:00": d_falta = True
+                # Horários já vêm convertidos pelo índice (campos t_*)
+                if rec.get('t_entrada') == time(0, 0) and rec.get('t_saida') == time(0, 0): d_falta = True
                 
-                try: d_feriado = True if rec.iloc[0]['feriado_manual'] == 1 else False
-                except: pass
-                try: d_home_office = True if rec.iloc[0]['home_office'] == 1 else False
-                except: pass
+                d_feriado = rec.get('feriado_manual') == 1
+                d_home_office = rec.get('home_office') == 1
                 
                 if not d_falta:
-                    try:
-                        h, m, s = map(int, rec.iloc[0]['extra_inicio'].split(':'))
-                        d_ext_ini = time(h, m)
-                        h, m, s = map(int, rec.iloc[0]['extra_fim'].split(':'))
-                        d_ext_fim = time(h, m)
-                    except: pass
+                    d_ent = rec.get('t_entrada') or d_ent
+                    d_sai = rec.get('t_saida') or d_sai
+                    d_ai = rec.get('t_almoco_ida') or d_ai
+                    d_av = rec.get('t_almoco_volta') or d_av
+                    d_ext_ini = rec.get('t_extra_inicio') or d_ext_ini
+                    d_ext_fim = rec.get('t_extra_fim') or d_ext_fim
             
+            # Mês fechado: só leitura até ser reaberto
+            periodo_travado = bool(ultimo_fechado) and str(data_sel)[:7] <= ultimo_fechado
+            if periodo_travado:
+                st.warning(f"🔒 Período fechado até {ultimo_fechado}. Reabra o mês para editar este dia.")
+            elif not modo_demo and versao_linha != versao_form:
+                st.warning("⚠️ Este dia foi alterado em outra sessão desde que você o abriu.")
+                if st.button("🔄 Recarregar versão atual", use_container_width=True):
+                    st.session_state.form_data = None
+                    st.rerun()
+
             # --- FORMULÁRIO ---
             with st.form(key="form_lancamento", clear_on_submit=False):
                 ck1, ck2, ck3 = st.columns(3)
@@ -166,7 +208,7 @@ with tab_lancamento:
                 
                 # O texto do botão muda para dar feedback visual
                 txt_botao = "💾 Atualizar Registro" if modo_edicao else "💾 Salvar Novo Registro"
-                submitted = st.form_submit_button(txt_botao, type="primary", use_container_width=True, disabled=modo_demo)
+                submitted = st.form_submit_button(txt_botao, type="primary", use_container_width=True, disabled=modo_demo or periodo_travado)
                 
                 if submitted and not modo_demo:
                     dados_validos, msg_erro = ut.validar_registro(entrada, almoco_ida, almoco_volta, saida, is_falta)
@@ -174,6 +216,8 @@ with tab_lancamento:
                     if not dados_validos:
                         st.error(msg_erro)
                     else:
+                        if msg_erro:
+                            st.toast(msg_erro)  # avisos (almoço curto, virada de noite...) não bloqueiam
                         if is_falta:
                             entrada_salvar = almoco_ida_salvar = almoco_volta_salvar = saida_salvar = time(0,0)
                             ext_ini_salvar = ext_fim_salvar = time(0,0)
@@ -185,22 +229,35 @@ with tab_lancamento:
                             ext_ini_salvar = ext_ini
                             ext_fim_salvar = ext_fim
 
-                        db.salvar_registro(
-                            str(data_sel), entrada_salvar, almoco_ida_salvar, almoco_volta_salvar, saida_salvar, 
-                            ext_ini_salvar, ext_fim_salvar, obs, is_feriado, is_home_office
-                        )
-                        st.toast("✅ Registro salvo com sucesso!", icon="💾")
-                        st.rerun()
+                        try:
+                            nova_versao = db.salvar_registro(
+                                str(data_sel), entrada_salvar, almoco_ida_salvar, almoco_volta_salvar, saida_salvar, 
+                                ext_ini_salvar, ext_fim_salvar, obs, is_feriado, is_home_office,
+                                versao_esperada=versao_form
+                            )
+                        except (db.PeriodoFechadoError, db.ConflitoVersaoError) as e:
+                            st.error(str(e))
+                        else:
+                            st.session_state.form_versao = nova_versao  # a linha recebe a versão dos dados
+                            db.publicar_gravacao(livro, {
+                                'data': str(data_sel), 'entrada': str(entrada_salvar), 'almoco_ida': str(almoco_ida_salvar),
+                                'almoco_volta': str(almoco_volta_salvar), 'saida': str(saida_salvar),
+                                'extra_inicio': str(ext_ini_salvar), 'extra_fim': str(ext_fim_salvar), 'obs': obs,
+                                'feriado_manual': int(is_feriado), 'home_office': int(is_home_office),
+                                'versao': nova_versao
+                            }, nova_versao)
+                            st.toast("✅ Registro salvo com sucesso!", icon="💾")
+                            st.rerun()
 
             # --- ÁREA DE GESTÃO (ALTERAR E EXCLUIR) ---
             # Aqui atendemos seu pedido: "Alterar" fica embaixo, igual ao "Excluir"
-            if not df_bd.empty and not modo_demo:
+            if not indice.vazio and not modo_demo:
                 st.write("") # Espaçamento
                 
                 # OPÇÃO 1: ALTERAR (CARREGAR)
                 with st.expander("✏️ Procurar e Alterar Registro"):
-                    # Lista de datas disponíveis no banco
-                    lista_datas_banco = df_bd['data'].sort_values(ascending=False).tolist()
+                    # Lista de datas disponíveis no banco (já ordenada pelo índice)
+                    lista_datas_banco = indice.datas_desc
                     
                     c_sel_alt, c_btn_alt = st.columns([3, 1])
                     dt_alterar_str = c_sel_alt.selectbox("Selecione a data para editar:", options=lista_datas_banco, key="sel_alterar")
@@ -208,8 +265,7 @@ with tab_lancamento:
                     # Botão que joga a data lá para cima
                     if c_btn_alt.button("Carregar", use_container_width=True):
                         # Converte string do banco para objeto date
-                        ano, mes, dia = map(int, dt_alterar_str.split('-'))
-                        nova_data = date(ano, mes, dia)
+                        nova_data = date.fromisoformat(dt_alterar_str)
                         
                         # Atualiza a memória e recarrega a página
                         st.session_state.data_ativa = nova_data
@@ -217,33 +273,66 @@ with tab_lancamento:
 
                 # OPÇÃO 2: EXCLUIR
                 with st.expander("🗑️ Excluir Registro"):
-                    lista_datas = df_bd['data'].sort_values(ascending=False).tolist()
+                    lista_datas = indice.datas_desc
                     c_sel_del, c_btn_del = st.columns([3, 1])
                     dt_del = c_sel_del.selectbox("Apagar dia:", options=lista_datas, key="sel_excluir")
                     
                     if c_btn_del.button("Confirmar", type="secondary", use_container_width=True):
-                        db.excluir_registro(dt_del)
-                        st.rerun()
+                        rec_del = indice.buscar(dt_del)
+                        try:
+                            nova_versao = db.excluir_registro(dt_del, int(rec_del.get('versao') or 0) if rec_del else None)
+                        except (db.PeriodoFechadoError, db.ConflitoVersaoError) as e:
+                            st.error(str(e))
+                        else:
+                            db.publicar_exclusao(livro, dt_del, nova_versao)
+                            st.session_state.form_data = None  # refixa a versão do formulário no próximo rerun
+                            st.rerun()
+
+                # OPÇÃO 3: FECHAMENTO DE PERÍODO (CHECKPOINTS)
+                with st.expander("🔒 Fechamento de Período"):
+                    st.caption(f"Último mês fechado: **{ultimo_fechado or 'nenhum'}**. "
+                               "Meses fechados ficam congelados e não aceitam edição.")
+                    meses_abertos = consultas['meses_para_fechar'].result()
+                    if meses_abertos:
+                        c_sel_fch, c_btn_fch = st.columns([3, 1])
+                        mes_fechar = c_sel_fch.selectbox("Fechar até:", options=meses_abertos[::-1], key="sel_fechar")
+                        if c_btn_fch.button("Fechar", use_container_width=True):
+                            try:
+                                db.fechar_ate(mes_fechar)
+                            except ValueError as e:  # ex.: outra sessão fechou antes
+                                st.error(str(e))
+                            else:
+                                st.toast(f"🔒 Período fechado até {mes_fechar}.")
+                                st.rerun()
+
+                    if ultimo_fechado:
+                        c_sel_rea, c_btn_rea = st.columns([3, 1])
+                        mes_reabrir = c_sel_rea.selectbox("Reabrir a partir de:", options=consultas['meses_fechados'].result()[::-1], key="sel_reabrir")
+                        if c_btn_rea.button("Reabrir", type="secondary", use_container_width=True):
+                            try:
+                                db.reabrir_a_partir(mes_reabrir)
+                            except ValueError as e:  # ex.: outra sessão reabriu antes
+                                st.error(str(e))
+                            else:
+                                st.toast(f"🔓 Período reaberto a partir de {mes_reabrir}.")
+                                st.rerun()
 
 # --- LADO DIREITO (VISUALIZAÇÃO & KPIs) ---
     with col_view:
-        if not df_bd.empty:
-            df = ut.processar_dataframe(df_bd)
-            df[['meta', 'motivo']] = df.apply(ut.definir_meta, axis=1, result_type='expand')
-            df['saldo'] = df['total_trabalhado'] - df['meta']
+        if not livro.vazio:
+            df = livro.processado  # compartilhado: só leitura
             
-            # KPI Calculations
-            saldo_total = df['saldo'].sum()
-            dias_folga = saldo_total / 8.0
+            # KPI Calculations: checkpoints fechados + dias em aberto (mesma regra do fechamento em lote)
+            balanco = ut.balanco_consolidado(ultimo_fechado, acumulado_fechado, livro.processado_aberto)
+            saldo_total = balanco['saldo']
+            dias_folga = balanco['dias_folga']
             
-            credito_casa = df['extra_casa'].sum()
-            credito_escritorio = df['extra_escritorio'].sum()
-            total_creditos = credito_casa + credito_escritorio
-            total_debitos = df[df['saldo'] < 0]['saldo'].sum()
-            horas_premium = df[df['meta'] == 0]['total_trabalhado'].sum()
-            
-            media_dia = df[df['total_trabalhado'] > 0]['total_trabalhado'].mean()
-            if pd.isna(media_dia): media_dia = 0.0
+            credito_casa = balanco['extra_casa']
+            credito_escritorio = balanco['extra_escritorio']
+            total_creditos = balanco['total_creditos']
+            total_debitos = balanco['total_debitos']
+            horas_premium = balanco['plantoes']
+            media_dia = balanco['media_dia']
 
             # Layout Contábil
             st.markdown("### 🎯 Balanço de Horas")
@@ -298,6 +387,16 @@ with tab_lancamento:
                 hide_index=True
             )
             st.download_button("📥 Excel", ut.to_excel(df), "ponto.xlsx")
+
+            # Varredura vetorizada do histórico inteiro (mesmas regras do formulário)
+            inconsistencias = livro.inconsistencias
+            if not inconsistencias.empty:
+                n_erros = int((inconsistencias['severidade'] == 'erro').sum())
+                with st.expander(f"🩺 Inconsistências no histórico ({n_erros} erros, {len(inconsistencias) - n_erros} avisos)"):
+                    st.dataframe(
+                        inconsistencias.drop(columns=['linha']).sort_values('data', ascending=False),
+                        use_container_width=True, hide_index=True
+                    )
         else:
             st.warning("Sem dados.")
 
@@ -305,10 +404,8 @@ with tab_lancamento:
 with tab_analytics:
     st.header("Análise Gerencial & BI")
     
-    if not df_bd.empty:
-        df = ut.processar_dataframe(df_bd)
-        df[['meta', 'motivo']] = df.apply(ut.definir_meta, axis=1, result_type='expand')
-        df['saldo'] = (df['total_trabalhado'] - df['meta']).round(2)
+    if not livro.vazio:
+        df = livro.processado  # compartilhado: só leitura (os filtros abaixo trabalham em cópias)
         
         # --- ÁREA DE FILTROS ---
         st.markdown("### 🔍 Filtros de Análise")
@@ -330,22 +427,53 @@ with tab_analytics:
         c_f3.write("") # Espaço de alinhamento
         if c_f3.button("🧹 Limpar Tudo", on_click=limpar_filtro): st.rerun()
         
-        # APLICAÇÃO DOS FILTROS
         if isinstance(range_sel, tuple) and len(range_sel) == 2:
-            mask_data = (df['data_dt'].dt.date >= range_sel[0]) & (df['data_dt'].dt.date <= range_sel[1])
-            df_filtered = df.loc[mask_data].copy()
+            periodo_ini, periodo_fim = range_sel
         else:
-            df_filtered = df.copy()
-            
-        if ver_apenas_fds:
-            # Filtra onde a META é 0 (Definição técnica de dia não útil)
-            df_filtered = df_filtered[df_filtered['meta_calculada'] == 0]
-            if df_filtered.empty:
-                st.warning("Nenhum registro encontrado em Sábados, Domingos ou Feriados neste período.")
+            periodo_ini, periodo_fim = min_date_bd, max_date_bd
+
+        # APLICAÇÃO DOS FILTROS
+        _filtrado = {}
+        def filtrado():
+            # Só montado se alguma figura (ou agregação local) não estiver em cache
+            if not _filtrado:
+                mask_data = (df['data_dt'].dt.date >= periodo_ini) & (df['data_dt'].dt.date <= periodo_fim)
+                if ver_apenas_fds:
+                    # Filtra onde a META é 0 (Definição técnica de dia não útil)
+                    mask_data &= df['meta_calculada'] == 0
+                df_filtered = df.loc[mask_data].copy()
+                df_filtered['saldo'] = df_filtered['saldo'].round(2)
+                _filtrado['df'] = df_filtered
+            return _filtrado['df']
+
+        # AGREGAÇÕES (heatmap, dia da semana, chegada, proporção)
+        # No banco real vêm prontas do SQL, em cache por (período, filtro FDS, versão dos dados)
+        _agregados = {}
+        def agregados():
+            # Só calculado se alguma figura não estiver em cache
+            if not _agregados:
+                resultado = None
+                if not modo_demo and versao_bd is not None:
+                    try:
+                        resultado = db.agregados_analiticos(versao_bd, periodo_ini, periodo_fim, ver_apenas_fds)
+                    except Exception:
+                        resultado = None  # cai para o cálculo local abaixo
+                _agregados.update(resultado if resultado is not None else ut.agregar_dataframe(filtrado()))
+            return _agregados
+
+        # FIGURAS EM CACHE: mesma chave (período, filtro FDS, versão) = mesmo JSON, sem refazer os dados nem a figura
+        # (na demo os dados mudam a cada execução: sem cache)
+        chave_figuras = None if modo_demo or versao_bd is None else (periodo_ini, periodo_fim, ver_apenas_fds, versao_bd)
+
+        # Figuras só entram no cache com o filtro não vazio: todas lá = nada a filtrar neste rerun
+        figuras = ('heatmap', 'barras', 'saldo', 'pizza', 'dispersao', 'violino', 'histograma')
+        tem_dados = ut.figuras_em_cache(figuras, chave_figuras) or not filtrado().empty
+        if ver_apenas_fds and not tem_dados:
+            st.warning("Nenhum registro encontrado em Sábados, Domingos ou Feriados neste período.")
 
         st.markdown("---")
 
-        if not df_filtered.empty:
+        if tem_dados:
             # 1. HEATMAP (GitHub Style)
             st.subheader("📅 Mapa de Intensidade")
             
@@ -359,65 +487,71 @@ with tab_analytics:
                 * **Objetivo:** Identificar visualmente épocas de *Burnout* (tudo escuro) ou *Ociosidade*.
                 """)
                 
-            df_filtered['week'] = df_filtered['data_dt'].dt.isocalendar().week
-            df_filtered['weekday_num'] = df_filtered['data_dt'].dt.weekday
-            df_filtered['year'] = df_filtered['data_dt'].dt.year
-            hm_data = df_filtered.groupby(['year', 'week', 'weekday_num'])['total_trabalhado'].sum().reset_index()
-            
-            fig_git = go.Figure(data=go.Heatmap(
-                z=hm_data['total_trabalhado'], x=hm_data['week'], y=hm_data['weekday_num'],
-                colorscale='Greens', xgap=3, ygap=3, hoverongaps=False,
-                hovertemplate="Semana: %{x}<br>Dia: %{y}<br>Horas: %{z:.2f}h<extra></extra>"
-            ))
-            fig_git.update_layout(
-                plot_bgcolor='rgba(0,0,0,0)', height=250,
-                yaxis=dict(tickmode='array', tickvals=[0,1,2,3,4,5,6], ticktext=['Seg','Ter','Qua','Qui','Sex','Sáb','Dom'], autorange='reversed', title=None),
-                xaxis=dict(showgrid=False, title="Semana do Ano"), margin=dict(l=40, r=40, t=20, b=20)
-            )
-            st.plotly_chart(fig_git, use_container_width=True)
+            def construir_heatmap():
+                hm_data = agregados()['heatmap']
+                fig_git = go.Figure(data=go.Heatmap(
+                    z=hm_data['total_trabalhado'], x=hm_data['week'], y=hm_data['weekday_num'],
+                    colorscale='Greens', xgap=3, ygap=3, hoverongaps=False,
+                    hovertemplate="Semana: %{x}<br>Dia: %{y}<br>Horas: %{z:.2f}h<extra></extra>"
+                ))
+                fig_git.update_layout(
+                    plot_bgcolor='rgba(0,0,0,0)', height=250,
+                    yaxis=dict(tickmode='array', tickvals=[0,1,2,3,4,5,6], ticktext=['Seg','Ter','Qua','Qui','Sex','Sáb','Dom'], autorange='reversed', title=None),
+                    xaxis=dict(showgrid=False, title="Semana do Ano"), margin=dict(l=40, r=40, t=20, b=20)
+                )
+                return fig_git
+            st.plotly_chart(ut.figura_em_cache('heatmap', chave_figuras, construir_heatmap), use_container_width=True)
 
             # 2. BARRAS COM MOTIVO
             st.subheader("📊 Histórico Detalhado")
             legendas = {'horas_escritorio': 'Escritório', 'horas_casa': 'Casa (HO+Extra)', 'data': 'Data', 'value': 'Horas', 'motivo_dia': 'Tipo de Dia'}
             
-            # [MELHORIA UX] Adicionando Entrada e Saída no Tooltip (Hover)
-            fig_bar = px.bar(
-                df_filtered.sort_values('data_dt'), x='data', y=['horas_escritorio', 'horas_casa'], 
-                labels=legendas,
-                color_discrete_map={'horas_escritorio': '#3498DB', 'horas_casa': '#E67E22'},
-                # Agora o mouse mostra Entrada, Saída e o Motivo
-                hover_data=['entrada', 'saida', 'motivo_dia'], 
-                text_auto='.2f'
-            )
-            fig_bar.add_hline(y=ut.META_DIARIA, line_dash="dot", line_color="red", annotation_text="Meta 8h")
-            fig_bar.update_layout(legend_title_text='') 
-            fig_bar.update_traces(textposition="inside", cliponaxis=False)
-            st.plotly_chart(fig_bar, use_container_width=True)
+            def construir_barras():
+                # [MELHORIA UX] Adicionando Entrada e Saída no Tooltip (Hover)
+                fig_bar = px.bar(
+                    filtrado().sort_values('data_dt'), x='data', y=['horas_escritorio', 'horas_casa'], 
+                    labels=legendas,
+                    color_discrete_map={'horas_escritorio': '#3498DB', 'horas_casa': '#E67E22'},
+                    # Agora o mouse mostra Entrada, Saída e o Motivo
+                    hover_data=['entrada', 'saida', 'motivo_dia'], 
+                    text_auto='.2f'
+                )
+                fig_bar.add_hline(y=ut.META_DIARIA, line_dash="dot", line_color="red", annotation_text="Meta 8h")
+                fig_bar.update_layout(legend_title_text='') 
+                fig_bar.update_traces(textposition="inside", cliponaxis=False)
+                return fig_bar
+            st.plotly_chart(ut.figura_em_cache('barras', chave_figuras, construir_barras), use_container_width=True)
 
             # 3. SALDO E PIZZA
             c3, c4 = st.columns(2)
             with c3:
                 st.subheader("📈 Saldo Acumulado")
-                df_filtered = df_filtered.sort_values('data_dt')
-                df_filtered['saldo_acumulado'] = df_filtered['saldo'].cumsum().round(2)
-                
-                fig_line = px.line(
-                    df_filtered, x='data', y='saldo_acumulado', markers=True, 
-                    labels={'saldo_acumulado': 'Saldo (h)', 'data': 'Data'}, line_shape="spline"
-                )
-                fig_line.add_hline(y=0, line_dash="dot", line_color="gray")
-                fig_line.update_traces(hovertemplate='Data: %{x}<br>Saldo: %{y:.2f} h')
-                st.plotly_chart(fig_line, use_container_width=True)
+
+                def construir_saldo():
+                    df_linha = filtrado().sort_values('data_dt')
+                    df_linha['saldo_acumulado'] = df_linha['saldo'].cumsum().round(2)
+                    
+                    fig_line = px.line(
+                        df_linha, x='data', y='saldo_acumulado', markers=True, 
+                        labels={'saldo_acumulado': 'Saldo (h)', 'data': 'Data'}, line_shape="spline"
+                    )
+                    fig_line.add_hline(y=0, line_dash="dot", line_color="gray")
+                    fig_line.update_traces(hovertemplate='Data: %{x}<br>Saldo: %{y:.2f} h')
+                    return fig_line
+                st.plotly_chart(ut.figura_em_cache('saldo', chave_figuras, construir_saldo), use_container_width=True)
                 
             with c4:
                 st.subheader("🥧 Proporção Total")
-                fig_pie = px.pie(
-                    values=[df_filtered['horas_escritorio'].sum(), df_filtered['horas_casa'].sum()],
-                    names=["Escritório", "Casa"], hole=0.4,
-                    color_discrete_sequence=['#3498DB', '#E67E22']
-                )
-                fig_pie.update_traces(textinfo='percent+label', hovertemplate='%{label}: %{value:.2f} h')
-                st.plotly_chart(fig_pie, use_container_width=True)
+                def construir_pizza():
+                    proporcao = agregados()['proporcao']
+                    fig_pie = px.pie(
+                        values=[proporcao['escritorio'], proporcao['casa']],
+                        names=["Escritório", "Casa"], hole=0.4,
+                        color_discrete_sequence=['#3498DB', '#E67E22']
+                    )
+                    fig_pie.update_traces(textinfo='percent+label', hovertemplate='%{label}: %{value:.2f} h')
+                    return fig_pie
+                st.plotly_chart(ut.figura_em_cache('pizza', chave_figuras, construir_pizza), use_container_width=True)
 
             st.markdown("---")
             
@@ -446,18 +580,19 @@ with tab_analytics:
                     return round(parts[0] + parts[1]/60, 2)
                 except: return None
                 
-            df_filtered['ent_num'] = df_filtered['entrada'].apply(t_float)
-            
-            fig_scatter = px.scatter(
-                df_filtered, x="ent_num", y="total_trabalhado", color="saldo",
-                size="total_trabalhado", hover_data=['data', 'motivo_dia'], 
-                color_continuous_scale="RdYlGn",
-                labels={'ent_num': 'Chegada (h)', 'total_trabalhado': 'Jornada (h)', 'saldo': 'Saldo'}
-            )
-            fig_scatter.add_vline(x=9.0, line_dash="dot")
-            fig_scatter.add_hline(y=ut.META_DIARIA, line_dash="dot")
-            fig_scatter.update_traces(hovertemplate='Chegada: %{x:.2f}h<br>Jornada: %{y:.2f}h<br>Saldo: %{marker.color:.2f}h<br>Tipo: %{customdata[1]}')
-            st.plotly_chart(fig_scatter, use_container_width=True)
+            def construir_dispersao():
+                df_disp = filtrado().assign(ent_num=filtrado()['entrada'].apply(t_float))
+                fig_scatter = px.scatter(
+                    df_disp, x="ent_num", y="total_trabalhado", color="saldo",
+                    size="total_trabalhado", hover_data=['data', 'motivo_dia'], 
+                    color_continuous_scale="RdYlGn",
+                    labels={'ent_num': 'Chegada (h)', 'total_trabalhado': 'Jornada (h)', 'saldo': 'Saldo'}
+                )
+                fig_scatter.add_vline(x=9.0, line_dash="dot")
+                fig_scatter.add_hline(y=ut.META_DIARIA, line_dash="dot")
+                fig_scatter.update_traces(hovertemplate='Chegada: %{x:.2f}h<br>Jornada: %{y:.2f}h<br>Saldo: %{marker.color:.2f}h<br>Tipo: %{customdata[1]}')
+                return fig_scatter
+            st.plotly_chart(ut.figura_em_cache('dispersao', chave_figuras, construir_dispersao), use_container_width=True)
 
             st.markdown("---")
             
@@ -491,20 +626,27 @@ with tab_analytics:
                     Mostram seus recordes de horário mínimo e máximo daquele dia da semana.
                     """)
 
-            df_filtered['weekday_name'] = df_filtered['data_dt'].dt.strftime("%A")
-            dias_map = {'Monday': 'Segunda', 'Tuesday': 'Terça', 'Wednesday': 'Quarta', 'Thursday': 'Quinta', 'Friday': 'Sexta', 'Saturday': 'Sábado', 'Sunday': 'Domingo'}
-            df_filtered['dia_pt'] = df_filtered['weekday_name'].map(dias_map).fillna(df_filtered['weekday_name'])
             ordem = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+            cores = px.colors.qualitative.Plotly
             
-            fig_violin = px.violin(
-                df_filtered, y="total_trabalhado", x="dia_pt", box=True, points="all", 
-                hover_data=['data'], color="dia_pt", category_orders={"dia_pt": ordem},
-                labels={'dia_pt': 'Dia', 'total_trabalhado': 'Horas'}
-            )
-            fig_violin.add_hline(y=ut.META_DIARIA, line_dash="dot", line_color="red")
-            fig_violin.update_layout(showlegend=False)
-            fig_violin.update_traces(hovertemplate='Dia: %{x}<br>Horas: %{y:.2f} h')
-            st.plotly_chart(fig_violin, use_container_width=True)
+            def construir_violino():
+                # Um violino por dia da semana, a partir das listas de horas já agrupadas
+                fig_violin = go.Figure()
+                for _, linha_semana in agregados()['semana'].iterrows():
+                    n_dia = int(linha_semana['weekday_num'])
+                    horas_dia = list(linha_semana['horas'])
+                    fig_violin.add_trace(go.Violin(
+                        x=[ordem[n_dia]] * len(horas_dia), y=horas_dia, name=ordem[n_dia],
+                        box_visible=True, points="all", line_color=cores[n_dia % len(cores)]
+                    ))
+                fig_violin.add_hline(y=ut.META_DIARIA, line_dash="dot", line_color="red")
+                fig_violin.update_layout(
+                    showlegend=False, yaxis_title='Horas',
+                    xaxis=dict(title='Dia', categoryorder='array', categoryarray=ordem)
+                )
+                fig_violin.update_traces(hovertemplate='Dia: %{x}<br>Horas: %{y:.2f} h')
+                return fig_violin
+            st.plotly_chart(ut.figura_em_cache('violino', chave_figuras, construir_violino), use_container_width=True)
             
             # 6. HISTOGRAMA
             st.markdown("---")
@@ -514,14 +656,18 @@ with tab_analytics:
             with st.expander("ℹ️ Dica de Pontualidade"):
                  st.markdown("Barras altas e finas indicam **disciplina**. Barras baixas e espalhadas indicam **horários flexíveis/caóticos**.")
 
-            fig_hist = px.histogram(
-                df_filtered, x="ent_num", nbins=20, 
-                labels={'ent_num': 'Hora Chegada', 'count': 'Freq.'},
-                color_discrete_sequence=['#9B59B6']
-            )
-            fig_hist.update_layout(bargap=0.1)
-            fig_hist.update_traces(hovertemplate='Hora: %{x:.2f}h<br>Dias: %{y}')
-            st.plotly_chart(fig_hist, use_container_width=True)
+            def construir_histograma():
+                # Faixas já contadas (width_bucket no banco / np.histogram na demo)
+                bins_chegada = agregados()['chegada']
+                largura_bin = bins_chegada['fim'] - bins_chegada['inicio']
+                fig_hist = go.Figure(go.Bar(
+                    x=bins_chegada['inicio'] + largura_bin / 2, y=bins_chegada['dias'],
+                    width=largura_bin * 0.9, marker_color='#9B59B6'
+                ))
+                fig_hist.update_layout(xaxis_title='Hora Chegada', yaxis_title='Freq.')
+                fig_hist.update_traces(hovertemplate='Hora: %{x:.2f}h<br>Dias: %{y}')
+                return fig_hist
+            st.plotly_chart(ut.figura_em_cache('histograma', chave_figuras, construir_histograma), use_container_width=True)
 
     else:
         if modo_demo:
@@ -536,8 +682,11 @@ with tab_auditoria:
     
     if not modo_demo:
         try:
-            df_logs = db.buscar_logs()
+            df_logs = consultas['logs'].result().drop(columns=['diff'], errors='ignore')
             if not df_logs.empty:
+                # Gravado em UTC; exibido no horário de São Paulo (o mesmo da viagem no tempo)
+                df_logs['data_evento'] = (pd.to_datetime(df_logs['data_evento']).dt.tz_localize('UTC')
+                                          .dt.tz_convert(ut.FUSO_SP).dt.tz_localize(None))
                 # Estilização da Tabela de Logs
                 st.dataframe(
                     df_logs.style.applymap(
@@ -551,5 +700,130 @@ with tab_auditoria:
                 st.info("Nenhum evento de auditoria registrado ainda.")
         except Exception as e:
             st.error(f"Erro ao buscar logs: {e}")
+
+        st.divider()
+        st.subheader("⏪ Viagem no Tempo")
+        st.caption("Reconstrói os registros como estavam num instante passado (snapshot + alterações). "
+                   "Horário de São Paulo.")
+        c_tt1, c_tt2, c_tt3 = st.columns([1, 1, 1])
+        dia_tt = c_tt1.date_input("Dia", value=datetime.now(ut.FUSO_SP).date(), format="DD/MM/YYYY", key="tt_dia")
+        hora_tt = c_tt2.time_input("Hora", value=time(23, 59), key="tt_hora")
+        c_tt3.write("")
+        c_tt3.write("")
+        if c_tt3.button("🔎 Reconstruir", use_container_width=True):
+            try:
+                df_passado = db.registros_em(datetime.combine(dia_tt, hora_tt, tzinfo=ut.FUSO_SP))
+                if df_passado is None:
+                    st.info("ℹ️ Instante anterior ao primeiro snapshot: não há histórico de alterações para reconstruir.")
+                elif df_passado.empty:
+                    st.info("Nenhum registro existia nesse instante.")
+                else:
+                    st.dataframe(df_passado, use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.error(f"Erro ao reconstruir: {e}")
     else:
-        st.warning("⚠️ Auditoria não disponível no modo DEMO.")
\ No newline at end of file
+        st.warning("⚠️ Auditoria não disponível no modo DEMO.")
+
+# ABA 4: PROJEÇÃO (E SE...)
+with tab_projecao:
+    st.header("🔮 Projeção do Saldo")
+    st.markdown("Simule jornadas futuras e veja onde o saldo termina e quantas folgas isso rende.")
+
+    # Ponto de partida: o mesmo balanço consolidado dos KPIs
+    if not df_bd.empty:
+        saldo_atual = ut.balanco_consolidado(ultimo_fechado, acumulado_fechado, livro.processado_aberto)['saldo']
+    else:
+        saldo_atual = 0.0
+
+    amanha = date.today() + timedelta(days=1)
+    c_p1, c_p2, c_p3 = st.columns(3)
+    fim_proj = c_p1.date_input("Projetar até", value=max(date(date.today().year, 12, 31), amanha),
+                               min_value=amanha, format="DD/MM/YYYY", key="proj_fim")
+    c_p2.metric("Saldo Atual", f"{saldo_atual:+.2f}h")
+    trabalha_feriados = c_p3.checkbox("Trabalhar em feriados", key="proj_feriados",
+                                      help="Por padrão a jornada não é cumprida em feriados de SP.")
+
+    st.caption("Jornada padrão (segunda a sexta)")
+    c_j1, c_j2, c_j3, c_j4 = st.columns(4)
+    j_ent = c_j1.time_input("Entrada", value=time(9, 0), key="proj_ent")
+    j_ai = c_j2.time_input("Almoço Ida", value=time(12, 0), key="proj_ai")
+    j_av = c_j3.time_input("Almoço Volta", value=time(13, 0), key="proj_av")
+    j_sai = c_j4.time_input("Saída", value=time(18, 0), key="proj_sai")
+    jornada_base = {d: (j_ent, j_ai, j_av, j_sai) for d in range(5)}
+
+    # 1. CENÁRIO ÚNICO
+    st.markdown("---")
+    st.subheader("🎯 Cenário")
+    c_s1, c_s2 = st.columns([2, 1])
+    dias_cenario = c_s1.multiselect("Dias com saída diferente", options=list(range(5)), default=[4],
+                                    format_func=lambda d: ut.NOMES_DIAS[d], key="proj_dias")
+    saida_cenario = c_s2.time_input("Sair às", value=time(17, 0), key="proj_saida_cenario")
+
+    proj_base = ut.projetar(ut.grade_candidatos(jornada_base, {}), amanha, fim_proj,
+                            saldo_atual, trabalha_feriados=trabalha_feriados)
+    proj_cenario = ut.projetar(ut.grade_candidatos(jornada_base, {d: [saida_cenario] for d in dias_cenario}),
+                               amanha, fim_proj, saldo_atual, trabalha_feriados=trabalha_feriados)
+
+    saldo_cenario = float(proj_cenario.saldo_final[0])
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Saldo Final (Cenário)", f"{saldo_cenario:+.2f}h",
+              delta=f"{saldo_cenario - float(proj_base.saldo_final[0]):+.2f}h vs. jornada padrão")
+    k2.metric("Em Dias de Folga", f"{float(proj_cenario.dias_folga[0]):.1f} dias")
+    k3.metric("Folgas Ganhas no Período", f"{int(proj_cenario.folgas_ganhas[0])}")
+
+    fig_proj = go.Figure()
+    curva_base, curva_cenario = proj_base.curva(0), proj_cenario.curva(0)
+    fig_proj.add_trace(go.Scatter(x=curva_base['data'], y=curva_base['saldo'], name="Jornada padrão",
+                                  line=dict(color='#95a5a6', dash='dot')))
+    fig_proj.add_trace(go.Scatter(x=curva_cenario['data'], y=curva_cenario['saldo'], name="Cenário",
+                                  line=dict(color='#3498db', width=3)))
+    fig_proj.add_hline(y=0, line_color='#e74c3c', line_width=1)
+    fig_proj.update_layout(height=350, yaxis_title="Saldo (h)", margin=dict(t=20, b=20), hovermode='x unified')
+    st.plotly_chart(fig_proj, use_container_width=True)
+
+    # 2. EXPLORAÇÃO EM MASSA
+    st.markdown("---")
+    st.subheader("🧪 Explorar Combinações")
+    st.caption("Testa todas as combinações de horário de saída de segunda a sexta de uma vez.")
+    c_e1, c_e2, c_e3, c_e4 = st.columns(4)
+    saida_min = c_e1.time_input("Saída mais cedo", value=time(16, 0), key="proj_min")
+    saida_max = c_e2.time_input("Saída mais tarde", value=time(19, 0), key="proj_max")
+    passo = c_e3.selectbox("Passo (min)", options=[15, 30, 60], index=1, key="proj_passo")
+    saldo_alvo = c_e4.number_input("Saldo final desejado (h)", value=float(round(max(saldo_atual, 0.0) + 8.0)),
+                                   step=1.0, key="proj_alvo")
+
+    min_ini = saida_min.hour * 60 + saida_min.minute
+    min_fim = saida_max.hour * 60 + saida_max.minute
+    opcoes_saida = [f"{m // 60:02d}:{m % 60:02d}" for m in range(min_ini, min_fim + 1, passo)]
+    n_candidatos = len(opcoes_saida) ** 5
+
+    if not opcoes_saida:
+        st.warning("A saída mais cedo precisa ser anterior à mais tarde.")
+    elif n_candidatos > 200_000:
+        st.warning(f"{n_candidatos:,} combinações é demais: aumente o passo ou reduza a janela.")
+    else:
+        proj_grade = ut.projetar(ut.grade_candidatos(jornada_base, {d: opcoes_saida for d in range(5)}),
+                                 amanha, fim_proj, saldo_atual, trabalha_feriados=trabalha_feriados)
+        atingem = int((proj_grade.saldo_final >= saldo_alvo).sum())
+        g1, g2 = st.columns(2)
+        g1.metric("Combinações Avaliadas", f"{len(proj_grade):,}")
+        g2.metric("Atingem o Saldo Desejado", f"{atingem:,}")
+
+        col_tab, col_hist = st.columns([3, 2])
+        with col_tab:
+            st.markdown("**Jornadas que chegam ao alvo trabalhando menos**")
+            df_melhores = ut.melhores(proj_grade, saldo_alvo, n=10)
+            if df_melhores.empty:
+                st.info("Nenhuma combinação atinge o saldo desejado. Amplie a janela de saída.")
+            else:
+                st.dataframe(
+                    df_melhores.rename(columns={'saldo_final': 'Saldo Final', 'dias_folga': 'Dias de Folga',
+                                                'folgas_ganhas': 'Folgas Ganhas'}),
+                    use_container_width=True, hide_index=True
+                )
+        with col_hist:
+            fig_dist = px.histogram(x=proj_grade.saldo_final, nbins=40, labels={'x': 'Saldo final (h)'},
+                                    color_discrete_sequence=['#3498db'])
+            fig_dist.add_vline(x=saldo_alvo, line_color='#2ecc71', line_dash='dash')
+            fig_dist.update_layout(height=300, yaxis_title="Combinações", margin=dict(t=20, b=20), showlegend=False)
+            st.plotly_chart(fig_dist, use_container_width=True)
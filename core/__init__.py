@@ -0,0 +1,46 @@
+"""
+Núcleo do Banco de Horas (Python puro, sem Streamlit).
+
+Motor de saldo, calendário SP, validação, projeção e armazenamento. O Streamlit entra
+apenas pelos adaptadores `utils.py` e `database.py`.
+
+Os submódulos são carregados sob demanda: `import core` não puxa pandas,
+holidays nem SQLAlchemy, só o que for efetivamente usado.
+"""
+import importlib
+
+# nome público -> submódulo que o define
+_EXPORTS = {
+    # calendário
+    'META_DIARIA': 'core.calendario',
+    'obter_feriados_sp': 'core.calendario',
+    'definir_meta': 'core.calendario',
+    # motor de saldo
+    'parse_db_time_to_delta': 'core.saldo',
+    'calcular_delta_com_virada': 'core.saldo',
+    'processar_dataframe': 'core.saldo',
+    'resumir_balanco': 'core.saldo',
+    # validação
+    'validar_registro': 'core.validacao',
+    'validar_lote': 'core.validacao',
+    # exportação
+    'to_excel': 'core.exportacao',
+    # projeção "e se"
+    'grade_candidatos': 'core.projecao',
+    'projetar': 'core.projecao',
+    # cache
+    'CacheLRU': 'core.cache',
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(nome):
+    modulo = _EXPORTS.get(nome)
+    if modulo is None:
+        raise AttributeError(f"module 'core' has no attribute '{nome}'")
+    valor = getattr(importlib.import_module(modulo), nome)
+    globals()[nome] = valor  # próximas consultas não passam mais por aqui
+    return valor
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
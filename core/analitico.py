@@ -0,0 +1,179 @@
+"""
+Agregações da aba de Análise (heatmap, dia da semana, chegada, proporção).
+
+No PostgreSQL o cálculo é feito no banco (GROUP BY / extract / width_bucket)
+e só as células agregadas trafegam. Para os cenários de demonstração (e bancos
+sem esses recursos, como o SQLite local) há a versão em pandas, com o mesmo
+formato de saída.
+
+As horas seguem as regras de `core.saldo.processar_dataframe`: virada de
+meia-noite, extra com virada e distribuição casa/escritório por home office.
+"""
+from datetime import date
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from core.calendario import obter_feriados_sp
+from core.validacao import horarios_em_minutos
+
+BINS_CHEGADA = 20
+
+# --- SQL (POSTGRESQL) ---
+_HORA = "COALESCE(EXTRACT(EPOCH FROM NULLIF(NULLIF({c}, 'None'), '')::time) / 3600.0, 0)"
+
+_CTE_DIAS = f'''
+    WITH horas AS (
+        SELECT data::date AS dia,
+               EXTRACT(EPOCH FROM NULLIF(NULLIF(entrada, 'None'), '')::time) / 3600.0 AS chegada,
+               {_HORA.format(c='entrada')} AS h_ent,
+               {_HORA.format(c='almoco_ida')} AS h_ai,
+               {_HORA.format(c='almoco_volta')} AS h_av,
+               {_HORA.format(c='saida')} AS h_sai,
+               {_HORA.format(c='extra_inicio')} AS h_ei,
+               {_HORA.format(c='extra_fim')} AS h_ef,
+               COALESCE(home_office, 0) AS ho,
+               COALESCE(feriado_manual, 0) AS fer
+        FROM registros
+        WHERE data BETWEEN :inicio AND :fim
+    ), viradas AS (
+        SELECT *, (h_sai < h_ent AND h_sai > 0) AS virada FROM horas
+    ), dias AS (
+        SELECT dia, chegada, ho, fer,
+               CASE WHEN h_sai = 0 THEN 0  -- turno em aberto: saída ainda não batida
+                    ELSE (h_sai + CASE WHEN virada THEN 24 ELSE 0 END - h_ent)
+                         - (h_av - h_ai + CASE WHEN virada AND h_av < h_ai THEN 24 ELSE 0 END)
+               END AS principal,
+               CASE WHEN h_ei = h_ef THEN 0
+                    WHEN h_ef < h_ei THEN h_ef + 24 - h_ei
+                    ELSE h_ef - h_ei END AS extra
+        FROM viradas
+    ), classificados AS (
+        SELECT dia, chegada,
+               CASE WHEN ho = 1 THEN 0 ELSE principal END AS escritorio,
+               CASE WHEN ho = 1 THEN principal + extra ELSE extra END AS casa,
+               (fer = 1 OR EXTRACT(ISODOW FROM dia) >= 6 OR dia = ANY(:feriados)) AS nao_util
+        FROM dias
+    ), filtrados AS (
+        SELECT *, escritorio + casa AS total FROM classificados
+        WHERE NOT :apenas_fds OR nao_util
+    )
+'''
+
+SQL_HEATMAP = text(_CTE_DIAS + '''
+    SELECT EXTRACT(YEAR FROM dia)::int AS year,
+           EXTRACT(WEEK FROM dia)::int AS week,
+           EXTRACT(ISODOW FROM dia)::int - 1 AS weekday_num,
+           ROUND(SUM(total)::numeric, 2)::float AS total_trabalhado
+    FROM filtrados
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+''')
+
+SQL_SEMANA = text(_CTE_DIAS + '''
+    SELECT EXTRACT(ISODOW FROM dia)::int - 1 AS weekday_num,
+           array_agg(ROUND(total::numeric, 2)::float ORDER BY dia) AS horas
+    FROM filtrados
+    GROUP BY 1
+    ORDER BY 1
+''')
+
+SQL_CHEGADA = text(_CTE_DIAS + f'''
+    , limites AS (
+        SELECT MIN(chegada) AS lo, MAX(chegada) AS hi FROM filtrados WHERE chegada IS NOT NULL
+    )
+    SELECT width_bucket(f.chegada, l.lo, l.hi + 1e-9, {BINS_CHEGADA}) AS bucket,
+           MIN(l.lo) AS lo, MIN(l.hi) AS hi, COUNT(*) AS dias
+    FROM filtrados f CROSS JOIN limites l
+    WHERE f.chegada IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1
+''')
+
+SQL_PROPORCAO = text(_CTE_DIAS + '''
+    SELECT COALESCE(SUM(escritorio), 0)::float AS escritorio,
+           COALESCE(SUM(casa), 0)::float AS casa
+    FROM filtrados
+''')
+
+def suporta_sql(engine) -> bool:
+    return engine.dialect.name == 'postgresql'
+
+def feriados_no_intervalo(inicio: date, fim: date) -> List[date]:
+    feriados = []
+    for ano in range(inicio.year, fim.year + 1):
+        feriados.extend(d for d in obter_feriados_sp(ano).keys() if inicio <= d <= fim)
+    return sorted(feriados)
+
+def _bins_para_frame(contagens, lo: float, hi: float) -> pd.DataFrame:
+    largura = (hi - lo) / BINS_CHEGADA if hi > lo else 1.0
+    idx = np.arange(BINS_CHEGADA)
+    return pd.DataFrame({
+        'inicio': lo + idx * largura,
+        'fim': lo + (idx + 1) * largura,
+        'dias': np.asarray(contagens, dtype=int),
+    })
+
+def consultar_agregados(engine, inicio: date, fim: date, apenas_fds: bool) -> dict:
+    """Todas as agregações da aba de Análise, calculadas no banco numa única conexão."""
+    # `feriados` vai como lista Python: o psycopg2 converte para ARRAY (usado em `= ANY(...)`)
+    params = {
+        'inicio': inicio.isoformat(), 'fim': fim.isoformat(), 'apenas_fds': bool(apenas_fds),
+        'feriados': feriados_no_intervalo(inicio, fim),
+    }
+    with engine.connect() as conn:
+        heatmap = pd.read_sql(SQL_HEATMAP, conn, params=params)
+        semana = pd.read_sql(SQL_SEMANA, conn, params=params)
+        chegada = pd.read_sql(SQL_CHEGADA, conn, params=params)
+        proporcao = conn.execute(SQL_PROPORCAO, params).mappings().one()
+
+    if chegada.empty:
+        bins = _bins_para_frame(np.zeros(BINS_CHEGADA), 0.0, 0.0)
+    else:
+        contagens = np.zeros(BINS_CHEGADA)
+        # width_bucket devolve 1..N (o +1e-9 no topo mantém o máximo no último bin)
+        contagens[chegada['bucket'].clip(1, BINS_CHEGADA).to_numpy(dtype=int) - 1] = chegada['dias'].to_numpy()
+        bins = _bins_para_frame(contagens, float(chegada['lo'].iloc[0]), float(chegada['hi'].iloc[0]))
+
+    return {
+        'heatmap': heatmap,
+        'semana': semana,
+        'chegada': bins,
+        'proporcao': {'escritorio': float(proporcao['escritorio']), 'casa': float(proporcao['casa'])},
+    }
+
+# --- PANDAS (DEMO / FALLBACK) ---
+def agregar_dataframe(df_filtrado: pd.DataFrame) -> dict:
+    """Mesmo formato de `consultar_agregados`, a partir de um DataFrame já processado e filtrado."""
+    datas = df_filtrado['data_dt']
+    iso = datas.dt.isocalendar()
+    heatmap = (
+        df_filtrado.assign(year=datas.dt.year, week=iso.week.astype(int), weekday_num=datas.dt.weekday)
+        .groupby(['year', 'week', 'weekday_num'])['total_trabalhado'].sum().round(2).reset_index()
+    )
+
+    semana = (
+        df_filtrado.assign(weekday_num=datas.dt.weekday).sort_values('data_dt')
+        .groupby('weekday_num')['total_trabalhado'].agg(list).rename('horas').reset_index()
+    )
+
+    chegada = horarios_em_minutos(df_filtrado['entrada']) / 60.0
+    chegada = chegada[~np.isnan(chegada)]
+    if len(chegada):
+        lo, hi = float(chegada.min()), float(chegada.max())
+        contagens, _ = np.histogram(chegada, bins=BINS_CHEGADA, range=(lo, hi if hi > lo else lo + 1.0))
+        bins = _bins_para_frame(contagens, lo, hi)
+    else:
+        bins = _bins_para_frame(np.zeros(BINS_CHEGADA), 0.0, 0.0)
+
+    return {
+        'heatmap': heatmap,
+        'semana': semana,
+        'chegada': bins,
+        'proporcao': {
+            'escritorio': float(df_filtrado['horas_escritorio'].sum()),
+            'casa': float(df_filtrado['horas_casa'].sum()),
+        },
+    }
@@ -0,0 +1,429 @@
+"""
+Camada de armazenamento (PostgreSQL / Neon, ou SQLite local).
+
+Todas as funções recebem um `engine` SQLAlchemy; quem decide de onde ele vem
+é o adaptador (`database.py` no Streamlit, `create_engine` nos CLIs).
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import bindparam, create_engine, event, text
+from sqlalchemy.engine import make_url
+
+from core import auditoria as aud
+from core.resiliencia import com_retentativa
+
+# --- POOL DE CONEXÕES (NEON SERVERLESS) ---
+# O Neon suspende o compute após ~5 min ocioso e derruba conexões paradas:
+# reciclamos antes disso e testamos cada conexão ao tirá-la do pool.
+POOL_PADRAO = {
+    'pool_size': 5,
+    'max_overflow': 5,
+    'pool_timeout': 10,
+    'pool_recycle': 240,
+    'pool_pre_ping': True,
+}
+
+# Keepalive TCP do libpq: detecta conexão morta em segundos, não em minutos
+KEEPALIVE_PG = {
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+    'connect_timeout': 10,
+}
+
+def dialeto_da_url(url: str) -> str:
+    """'postgresql+psycopg2://...' -> 'postgresql+psycopg2' (o que `opcoes_pool` espera)."""
+    return make_url(url).drivername
+
+def opcoes_pool(dialeto: str = 'postgresql', **sobrescritas) -> dict:
+    """
+    Monta os kwargs do `create_engine`. `dialeto` é o da URL ('postgresql',
+    'postgresql+psycopg2', 'sqlite'...): keepalive do libpq só com driver psycopg.
+    Variáveis de ambiente BANCO_POOL_SIZE, BANCO_MAX_OVERFLOW, BANCO_POOL_TIMEOUT
+    e BANCO_POOL_RECYCLE sobrescrevem os padrões; `sobrescritas` vence tudo.
+    """
+    opcoes = dict(POOL_PADRAO)
+    for chave in ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle'):
+        valor = os.environ.get(f"BANCO_{chave.upper()}")
+        if valor: opcoes[chave] = int(valor)
+
+    if dialeto.startswith('sqlite'):
+        # SQLite usa pool próprio (sem pool_size/overflow) e não tem keepalive
+        opcoes = {'pool_pre_ping': True}
+    elif dialeto.startswith('postgresql') and ('+' not in dialeto or 'psycopg' in dialeto):
+        opcoes['connect_args'] = dict(KEEPALIVE_PG)  # parâmetros do libpq
+
+    opcoes.update(sobrescritas)
+    return opcoes
+
+def criar_engine(url: str, **kwargs):
+    opcoes = opcoes_pool(dialeto_da_url(url))
+    opcoes.update(kwargs)
+    return create_engine(url, **opcoes)
+
+def aquecer(engine, conexoes: int = 1):
+    """Acorda o banco (cold start do Neon) e deixa `conexoes` prontas no pool."""
+    abertas = []
+    try:
+        for _ in range(conexoes):
+            conn = engine.connect()
+            conn.execute(SQL_PING)
+            abertas.append(conn)
+    finally:
+        for conn in abertas:
+            conn.close()  # volta para o pool, já autenticada
+
+def aquecer_em_segundo_plano(engine, conexoes: int = 1) -> threading.Thread:
+    """Dispara `aquecer` numa thread daemon; falhas são ignoradas (a primeira consulta tenta de novo)."""
+    def _alvo():
+        try:
+            com_retentativa(aquecer)(engine, conexoes)
+        except Exception:
+            pass
+    thread = threading.Thread(target=_alvo, name="aquecimento-banco", daemon=True)
+    thread.start()
+    return thread
+
+def injetar_latencia(engine, por_consulta: float = 0.0, por_conexao: float = 0.0):
+    """
+    Simula a rede/cold start de um Postgres serverless num banco local (ex.: SQLite),
+    para medir pool, aquecimento e retentativas sem depender do Neon.
+    """
+    if por_conexao:
+        @event.listens_for(engine, "connect")
+        def _atraso_conexao(dbapi_conn, conn_record):
+            time.sleep(por_conexao)
+    if por_consulta:
+        @event.listens_for(engine, "before_cursor_execute")
+        def _atraso_consulta(conn, cursor, statement, parameters, context, executemany):
+            time.sleep(por_consulta)
+    return engine
+
+# --- ERROS DE NEGÓCIO ---
+class PeriodoFechadoError(ValueError):
+    """Tentativa de alterar um dia de um mês já fechado (checkpoint ativo)."""
+
+class ConflitoVersaoError(ValueError):
+    """O dia foi alterado (ou apagado) por outra sessão depois de carregado no formulário."""
+
+# --- CONSULTAS QUENTES ---
+# Definidas uma vez no módulo: o SQLAlchemy reaproveita a compilação em cache
+# em vez de reprocessar o texto/parâmetros a cada chamada.
+SQL_PING = text("SELECT 1")
+
+SQL_UPSERT_REGISTRO = text('''
+    INSERT INTO registros (data, entrada, almoco_ida, almoco_volta, saida, extra_inicio, extra_fim, obs, feriado_manual, home_office)
+    VALUES (:data, :ent, :ai, :av, :sai, :ei, :ef, :obs, :fer, :ho)
+    ON CONFLICT (data) DO UPDATE SET
+        entrada = EXCLUDED.entrada,
+        almoco_ida = EXCLUDED.almoco_ida,
+        almoco_volta = EXCLUDED.almoco_volta,
+        saida = EXCLUDED.saida,
+        extra_inicio = EXCLUDED.extra_inicio,
+        extra_fim = EXCLUDED.extra_fim,
+        obs = EXCLUDED.obs,
+        feriado_manual = EXCLUDED.feriado_manual,
+        home_office = EXCLUDED.home_office;
+''')
+
+# Gravação otimista: só escreve se a linha ainda está na versão que o formulário
+# leu. Sem linha de retorno = outra sessão gravou antes (conflito). Não trava a
+# linha entre a leitura do formulário e o salvamento.
+# A versão da linha é a versão dos dados da escrita que a gravou (carimbada por
+# `avancar_versao` antes do commit): nunca se repete, nem quando o dia é apagado e recriado.
+SQL_CRIAR_CONDICIONAL = text('''
+    INSERT INTO registros (data, entrada, almoco_ida, almoco_volta, saida, extra_inicio, extra_fim, obs, feriado_manual, home_office)
+    VALUES (:data, :ent, :ai, :av, :sai, :ei, :ef, :obs, :fer, :ho)
+    ON CONFLICT (data) DO NOTHING
+    RETURNING data
+''')
+
+SQL_ATUALIZAR_CONDICIONAL = text('''
+    UPDATE registros SET
+        entrada = :ent, almoco_ida = :ai, almoco_volta = :av, saida = :sai,
+        extra_inicio = :ei, extra_fim = :ef, obs = :obs, feriado_manual = :fer, home_office = :ho
+    WHERE data = :data AND versao = :versao_esperada
+    RETURNING data
+''')
+
+# Linha atual do dia (o "antes" do diff de auditoria)
+SQL_LER_REGISTRO = text("SELECT * FROM registros WHERE data = :d")
+SQL_LER_REGISTRO_TRAVANDO = text("SELECT * FROM registros WHERE data = :d FOR UPDATE")
+
+SQL_AUDIT_SALVAR = text('''
+    INSERT INTO audit_logs (acao, data_registro, detalhes, diff)
+    VALUES ('SALVAR', :d, :det, :diff)
+    RETURNING id
+''')
+
+SQL_EXCLUIR_REGISTRO = text("DELETE FROM registros WHERE data = :d")
+SQL_EXCLUIR_CONDICIONAL = text("DELETE FROM registros WHERE data = :d AND versao = :versao_esperada")
+
+SQL_AUDIT_EXCLUIR = text('''
+    INSERT INTO audit_logs (acao, data_registro, detalhes, diff)
+    VALUES ('EXCLUIR', :d, :det, :diff)
+    RETURNING id
+''')
+
+SQL_CARREGAR = text("SELECT * FROM registros")
+
+# Pega os últimos 100 eventos (do mais recente pro mais antigo)
+SQL_LOGS = text("SELECT * FROM audit_logs ORDER BY id DESC LIMIT 100")
+
+# Último mês com checkpoint ativo: tudo até ele (inclusive) está travado
+SQL_ULTIMO_MES_FECHADO = text("SELECT MAX(mes) FROM checkpoints_mensais WHERE reaberto_em IS NULL")
+
+# Versão dos dados: contador de linha única, avançado no fim da transação de cada
+# escrita. O UPDATE trava a linha até o commit, então as versões saem na ordem de
+# commit (um id SERIAL sai na ordem do INSERT: o 11 pode commitar antes do 10).
+SQL_VERSAO = text("SELECT COALESCE(MAX(versao), 0) FROM versao_dados")
+SQL_AVANCAR_VERSAO = text("UPDATE versao_dados SET versao = versao + 1 WHERE id = 1 RETURNING versao")
+SQL_CARIMBAR_VERSAO = text("UPDATE registros SET versao = :versao WHERE data IN :datas").bindparams(
+    bindparam('datas', expanding=True))
+
+def _is_sqlite(engine) -> bool:
+    return engine.dialect.name == 'sqlite'
+
+def init_db(engine):
+    """Inicializa tabelas (Dados + Auditoria) e roda migrações."""
+    # SQLite não conhece SERIAL
+    id_auto = "INTEGER PRIMARY KEY AUTOINCREMENT" if _is_sqlite(engine) else "SERIAL PRIMARY KEY"
+    # Instantes da auditoria sempre em UTC: o CURRENT_TIMESTAMP do SQLite já é UTC; no
+    # Postgres, gravado numa coluna TIMESTAMP (sem fuso), ele seguiria o fuso da sessão
+    agora_utc = "CURRENT_TIMESTAMP" if _is_sqlite(engine) else "(CURRENT_TIMESTAMP AT TIME ZONE 'UTC')"
+
+    with engine.begin() as conn:
+        # 1. Tabela Principal
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS registros (
+                data TEXT PRIMARY KEY,
+                entrada TEXT,
+                almoco_ida TEXT,
+                almoco_volta TEXT,
+                saida TEXT,
+                extra_inicio TEXT,
+                extra_fim TEXT,
+                obs TEXT,
+                feriado_manual INTEGER DEFAULT 0,
+                home_office INTEGER DEFAULT 0,
+                versao INTEGER NOT NULL DEFAULT 1  -- versão dos dados da última escrita no dia (0 = dia ainda não existe)
+            );
+        '''))
+
+        # 2. Tabela de Auditoria
+        conn.execute(text(f'''
+            CREATE TABLE IF NOT EXISTS audit_logs (
+                id {id_auto},
+                data_evento TIMESTAMP DEFAULT {agora_utc},  -- UTC
+                acao TEXT,          -- 'SALVAR', 'EXCLUIR'
+                data_registro TEXT, -- Qual dia foi afetado
+                detalhes TEXT,      -- Msg descritiva
+                diff TEXT           -- JSON {{"antes": {{...}}, "depois": {{...}}}} só com o que mudou
+            );
+        '''))
+
+        # 2b. Snapshots completos de `registros` para a viagem no tempo
+        conn.execute(text(f'''
+            CREATE TABLE IF NOT EXISTS audit_snapshots (
+                id {id_auto},
+                ate_log_id INTEGER NOT NULL,   -- estado após este evento de auditoria
+                data_evento TIMESTAMP DEFAULT {agora_utc},  -- UTC
+                estado TEXT                    -- JSON {{data: linha}}
+            );
+        '''))
+
+        # 2c. Versão dos dados (linha única), continuando de onde a auditoria parou
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS versao_dados (
+                id INTEGER PRIMARY KEY,
+                versao INTEGER NOT NULL
+            );
+        '''))
+        conn.execute(text('''
+            INSERT INTO versao_dados (id, versao)
+            SELECT 1, COALESCE(MAX(id), 0) + 1 FROM audit_logs WHERE TRUE
+            ON CONFLICT (id) DO NOTHING;
+        '''))
+
+        # 3. Checkpoints de fechamento mensal (imutáveis: reabrir só marca reaberto_em)
+        conn.execute(text(f'''
+            CREATE TABLE IF NOT EXISTS checkpoints_mensais (
+                id {id_auto},
+                mes TEXT NOT NULL,          -- 'AAAA-MM'
+                saldo REAL,
+                extra_casa REAL,
+                extra_escritorio REAL,
+                total_debitos REAL,
+                plantoes REAL,
+                total_trabalhado REAL,
+                dias_registrados INTEGER,
+                dias_trabalhados INTEGER,
+                horas_dias_trabalhados REAL,
+                fechado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                reaberto_em TIMESTAMP
+            );
+        '''))
+        # No máximo um checkpoint ativo por mês
+        conn.execute(text('''
+            CREATE UNIQUE INDEX IF NOT EXISTS ux_checkpoint_ativo
+            ON checkpoints_mensais (mes) WHERE reaberto_em IS NULL;
+        '''))
+
+    # Migrações silenciosas (cada uma na sua transação: no Postgres um erro aborta a transação inteira)
+    colunas_novas = [
+        "ALTER TABLE registros ADD COLUMN extra_inicio TEXT;",
+        "ALTER TABLE registros ADD COLUMN extra_fim TEXT;",
+        "ALTER TABLE registros ADD COLUMN home_office INTEGER DEFAULT 0;",
+        "ALTER TABLE audit_logs ADD COLUMN diff TEXT;",
+        "ALTER TABLE registros ADD COLUMN versao INTEGER NOT NULL DEFAULT 1;"
+    ]
+    if not _is_sqlite(engine):
+        colunas_novas += [
+            f"ALTER TABLE audit_logs ALTER COLUMN data_evento SET DEFAULT {agora_utc};",
+            f"ALTER TABLE audit_snapshots ALTER COLUMN data_evento SET DEFAULT {agora_utc};",
+        ]
+    for sql in colunas_novas:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(sql))
+        except Exception:
+            pass
+
+    # A versão dos dados fica acima de qualquer versão de linha existente (o padrão
+    # legado é 1): a próxima escrita nunca repete a versão que um formulário já leu
+    with engine.begin() as conn:
+        conn.execute(text('''
+            UPDATE versao_dados SET versao = (SELECT MAX(registros.versao) + 1 FROM registros)
+            WHERE id = 1 AND versao <= (SELECT MAX(registros.versao) FROM registros);
+        '''))
+
+    # Marco zero da auditoria com diffs: sem ele não há de onde reconstruir
+    aud.snapshot_se_necessario(engine, 0)
+
+def avancar_versao(conn, datas=()) -> int:
+    """
+    Avança a versão dos dados na transação de `conn`, grava-a como versão das
+    linhas `datas` (já escritas e travadas por esta transação) e retorna o valor.
+
+    Último passo de toda escrita, logo antes do commit: a linha do contador só
+    fica travada nesse trecho final, então escritores em dias diferentes fazem
+    todo o resto em paralelo. Depois dela nada mais espera trava (sem deadlock).
+    """
+    versao = int(conn.execute(SQL_AVANCAR_VERSAO).scalar())
+    if datas:
+        conn.execute(SQL_CARIMBAR_VERSAO, {'versao': versao, 'datas': list(datas)})
+    return versao
+
+def ultimo_mes_fechado(conn):
+    """'AAAA-MM' do último checkpoint ativo, ou None."""
+    return conn.execute(SQL_ULTIMO_MES_FECHADO).scalar()
+
+def verificar_periodo_aberto(conn, data):
+    """Levanta PeriodoFechadoError se o dia pertence a um mês fechado (rollback da transação)."""
+    ultimo = ultimo_mes_fechado(conn)
+    if ultimo and str(data)[:7] <= ultimo:
+        raise PeriodoFechadoError(
+            f"🔒 O período até {ultimo} está fechado. Reabra o mês para alterar {str(data)[:10]}."
+        )
+
+def ler_registro(conn, data, travar: bool = False):
+    """Linha atual do dia (dict) ou None. `travar` segura a linha até o fim da transação (Postgres)."""
+    sql = SQL_LER_REGISTRO_TRAVANDO if travar and conn.dialect.name == 'postgresql' else SQL_LER_REGISTRO
+    return conn.execute(sql, {'d': data}).mappings().first()
+
+def salvar_registro(engine, data, entrada, a_ida, a_volta, saida, ext_ini, ext_fim, obs, is_feriado, is_home_office,
+                    versao_esperada=None) -> int:
+    """
+    Upsert do dia + auditoria na mesma transação. Retorna a nova versão dos
+    dados, que passa a ser também a versão da linha.
+
+    `versao_esperada` é a versão da linha quando o formulário a carregou (0 se o
+    dia não existia): se outra sessão gravou no meio do caminho, levanta
+    ConflitoVersaoError e nada é gravado. None = escrita incondicional.
+    """
+    feriado_int = 1 if is_feriado else 0
+    home_office_int = 1 if is_home_office else 0
+
+    params = {
+        "data": data, "ent": str(entrada), "ai": str(a_ida), "av": str(a_volta), "sai": str(saida),
+        "ei": str(ext_ini), "ef": str(ext_fim), "obs": obs, "fer": feriado_int, "ho": home_office_int
+    }
+
+    depois = {
+        'entrada': params['ent'], 'almoco_ida': params['ai'], 'almoco_volta': params['av'], 'saida': params['sai'],
+        'extra_inicio': params['ei'], 'extra_fim': params['ef'], 'obs': obs,
+        'feriado_manual': feriado_int, 'home_office': home_office_int
+    }
+
+    with engine.begin() as conn:
+        if versao_esperada is None:
+            antes = aud.linha_para_dict(ler_registro(conn, data, travar=True))
+            conn.execute(SQL_UPSERT_REGISTRO, params)
+        else:
+            # Sem FOR UPDATE: se a linha mudar depois desta leitura, a gravação condicional falha
+            antes = aud.linha_para_dict(ler_registro(conn, data))
+            sql = SQL_CRIAR_CONDICIONAL if versao_esperada == 0 else SQL_ATUALIZAR_CONDICIONAL
+            gravada = conn.execute(sql, {**params, 'versao_esperada': versao_esperada}).scalar()
+            # Nenhuma linha: o dia foi criado, alterado ou apagado (e talvez recriado) por outra sessão
+            if gravada is None:
+                raise ConflitoVersaoError(
+                    f"⚠️ O dia {str(data)[:10]} foi alterado em outra sessão depois que você o abriu. "
+                    "Recarregue para ver a versão atual antes de salvar."
+                )
+
+        # Checado depois do upsert: se um fechamento estiver em curso, a escrita
+        # esperou o lock dele e agora enxerga o checkpoint já gravado
+        verificar_periodo_aberto(conn, data)
+
+        # [AUDITORIA] Grava o rastro com o diff
+        diff = aud.calcular_diff(antes, depois)
+        log_id = conn.execute(SQL_AUDIT_SALVAR, {
+            'd': data, 'det': aud.descrever(diff), 'diff': aud.serializar(diff)
+        }).scalar()
+        nova_versao = avancar_versao(conn, [data])
+
+    aud.snapshot_se_necessario(engine, log_id)
+    return nova_versao
+
+def excluir_registro(engine, data_str, versao_esperada=None) -> int:
+    """Apaga o dia + auditoria na mesma transação. Retorna a nova versão dos dados."""
+    with engine.begin() as conn:
+        if versao_esperada is None:
+            antes = aud.linha_para_dict(ler_registro(conn, data_str, travar=True))
+            conn.execute(SQL_EXCLUIR_REGISTRO, {"d": data_str})
+        else:
+            antes = aud.linha_para_dict(ler_registro(conn, data_str))
+            apagadas = conn.execute(SQL_EXCLUIR_CONDICIONAL, {"d": data_str, "versao_esperada": versao_esperada}).rowcount
+            if not apagadas:
+                raise ConflitoVersaoError(
+                    f"⚠️ O dia {str(data_str)[:10]} foi alterado ou apagado em outra sessão. Nada foi excluído."
+                )
+        verificar_periodo_aberto(conn, data_str)
+
+        # [AUDITORIA] Grava o rastro da exclusão (a linha inteira vai no "antes")
+        diff = aud.calcular_diff(antes, None)
+        log_id = conn.execute(SQL_AUDIT_EXCLUIR, {
+            'd': data_str, 'det': aud.descrever(diff), 'diff': aud.serializar(diff)
+        }).scalar()
+        nova_versao = avancar_versao(conn)
+
+    aud.snapshot_se_necessario(engine, log_id)
+    return nova_versao
+
+@com_retentativa
+def carregar_dados(engine) -> pd.DataFrame:
+    return pd.read_sql(SQL_CARREGAR, engine)
+
+@com_retentativa
+def buscar_logs(engine) -> pd.DataFrame:
+    return pd.read_sql(SQL_LOGS, engine)
+
+@com_retentativa
+def versao_dados(engine) -> int:
+    """Versão atual dos dados (contador de escritas commitadas). Consulta mínima, serve de chave de cache."""
+    with engine.connect() as conn:
+        return int(conn.execute(SQL_VERSAO).scalar() or 0)
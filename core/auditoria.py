@@ -0,0 +1,141 @@
+"""
+Auditoria orientada a eventos.
+
+Cada SALVAR/EXCLUIR grava em `audit_logs.diff` um JSON compacto só com os
+campos que mudaram: {"antes": {...}, "depois": {...}} (antes = null na
+criação, depois = null na exclusão). A cada INTERVALO_SNAPSHOT eventos uma
+foto completa de `registros` vai para `audit_snapshots`, então reconstruir o
+estado em qualquer instante custa: 1 snapshot + no máximo ~INTERVALO_SNAPSHOT
+eventos, nunca o log inteiro.
+
+`data_evento` é gravado em UTC (ver `armazenamento.init_db`); instantes com
+fuso são convertidos antes da comparação.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+import pandas as pd
+from sqlalchemy import text
+
+from core.resiliencia import com_retentativa
+
+INTERVALO_SNAPSHOT = 200
+
+# Campos versionados de `registros` (`data` é a chave)
+CAMPOS_REGISTRO = ['entrada', 'almoco_ida', 'almoco_volta', 'saida', 'extra_inicio', 'extra_fim',
+                   'obs', 'feriado_manual', 'home_office']
+
+SQL_ULTIMO_SNAPSHOT = text("SELECT COALESCE(MAX(ate_log_id), -1) FROM audit_snapshots")
+
+SQL_ESTADO_ATUAL = text(f"SELECT data, {', '.join(CAMPOS_REGISTRO)} FROM registros")
+
+SQL_MAX_LOG = text("SELECT COALESCE(MAX(id), 0) FROM audit_logs")
+
+SQL_INSERIR_SNAPSHOT = text('''
+    INSERT INTO audit_snapshots (ate_log_id, estado) VALUES (:ate, :estado)
+''')
+
+SQL_SNAPSHOT_ANTES_DE = text('''
+    SELECT ate_log_id, estado FROM audit_snapshots
+    WHERE data_evento <= :instante
+    ORDER BY ate_log_id DESC
+    LIMIT 1
+''')
+
+SQL_EVENTOS_APOS = text('''
+    SELECT id, data_registro, diff FROM audit_logs
+    WHERE id > :ate AND data_evento <= :instante AND diff IS NOT NULL
+    ORDER BY id
+''')
+
+# --- DIFF ---
+def _normalizar(valor):
+    if valor is None: return None
+    if hasattr(valor, 'item'): valor = valor.item()  # numpy -> Python
+    if isinstance(valor, float) and valor != valor: return None  # NaN
+    return valor
+
+def linha_para_dict(linha) -> Optional[dict]:
+    if linha is None: return None
+    return {c: _normalizar(linha.get(c)) for c in CAMPOS_REGISTRO}
+
+def calcular_diff(antes: Optional[dict], depois: Optional[dict]) -> dict:
+    """Diff compacto entre duas versões da linha (só os campos alterados)."""
+    if antes is None or depois is None:
+        return {'antes': antes, 'depois': depois}
+    mudou = [c for c in CAMPOS_REGISTRO if antes.get(c) != depois.get(c)]
+    return {'antes': {c: antes.get(c) for c in mudou}, 'depois': {c: depois.get(c) for c in mudou}}
+
+def serializar(diff: dict) -> str:
+    return json.dumps(diff, ensure_ascii=False, separators=(',', ':'), default=str)
+
+def descrever(diff: dict) -> str:
+    """Resumo legível para a coluna `detalhes`."""
+    if diff['depois'] is None:
+        return "Registro apagado permanentemente."
+    if diff['antes'] is None:
+        return "Registro criado."
+    if not diff['depois']:
+        return "Salvo sem alterações."
+    return "; ".join(f"{c}: {diff['antes'][c]} → {diff['depois'][c]}" for c in diff['depois'])
+
+def aplicar_diff(estado: dict, data: str, diff: dict):
+    """Aplica um evento sobre o estado {data: linha}. Idempotente e em ordem de id."""
+    if diff['depois'] is None:
+        estado.pop(data, None)
+        return
+    linha = {} if diff['antes'] is None else dict(estado.get(data, {}))
+    linha.update(diff['depois'])
+    estado[data] = linha
+
+# --- SNAPSHOTS ---
+def gravar_snapshot(engine) -> int:
+    """Foto completa de `registros`, amarrada ao último id de auditoria. Retorna esse id."""
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            # Espera escritas em curso: estado e MAX(id) ficam consistentes entre si
+            conn.execute(text("LOCK TABLE registros IN SHARE MODE"))
+        ate = int(conn.execute(SQL_MAX_LOG).scalar() or 0)
+        estado = {str(r['data']): linha_para_dict(r) for r in conn.execute(SQL_ESTADO_ATUAL).mappings()}
+        conn.execute(SQL_INSERIR_SNAPSHOT, {'ate': ate, 'estado': serializar(estado)})
+    return ate
+
+def snapshot_se_necessario(engine, ultimo_id: Optional[int]):
+    """Chamado após cada escrita; grava snapshot quando o log andou INTERVALO_SNAPSHOT eventos."""
+    if ultimo_id is None: return
+    try:
+        with engine.connect() as conn:
+            ultimo_snapshot = conn.execute(SQL_ULTIMO_SNAPSHOT).scalar()
+        if ultimo_snapshot < 0 or ultimo_id - ultimo_snapshot >= INTERVALO_SNAPSHOT:
+            gravar_snapshot(engine)
+    except Exception:
+        pass  # snapshot é otimização: a próxima escrita tenta de novo
+
+# --- VIAGEM NO TEMPO ---
+def para_utc(instante: datetime) -> datetime:
+    """Instante no fuso de `data_evento` (UTC, sem tzinfo). Sem fuso = já está em UTC."""
+    if instante.tzinfo is None:
+        return instante
+    return instante.astimezone(timezone.utc).replace(tzinfo=None)
+
+@com_retentativa
+def registros_em(engine, instante: datetime) -> Optional[pd.DataFrame]:
+    """
+    Estado de `registros` no instante pedido (snapshot mais próximo + replay dos diffs).
+    Passe o instante com fuso (ex.: horário de São Paulo). None se o instante é
+    anterior ao primeiro snapshot (histórico sem diffs).
+    """
+    params = {'instante': para_utc(instante).strftime('%Y-%m-%d %H:%M:%S')}
+    with engine.connect() as conn:
+        snap = conn.execute(SQL_SNAPSHOT_ANTES_DE, params).mappings().first()
+        if snap is None:
+            return None
+        estado = json.loads(snap['estado'])
+        eventos = conn.execute(SQL_EVENTOS_APOS, {**params, 'ate': snap['ate_log_id']}).mappings().all()
+
+    for ev in eventos:
+        aplicar_diff(estado, str(ev['data_registro']), json.loads(ev['diff']))
+
+    linhas = [{'data': d, **linha} for d, linha in sorted(estado.items())]
+    return pd.DataFrame(linhas, columns=['data'] + CAMPOS_REGISTRO)
@@ -0,0 +1,72 @@
+"""
+LRU em memória do processo.
+
+Guarda os livros por versão (`core.livro.RepositorioLivros`) e as figuras do
+analytics (`utils.cache_figuras`).
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+_AUSENTE = object()
+
+class CacheLRU:
+    """LRU thread-safe, limitado por número de itens (e opcionalmente por bytes)."""
+
+    def __init__(self, max_itens: int = 128, max_bytes: Optional[int] = None,
+                 medir: Optional[Callable[[Any], int]] = None):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self._medir = medir or (lambda v: 0)
+        self._dados = OrderedDict()
+        self._tamanhos = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, chave, padrao=None):
+        with self._lock:
+            valor = self._dados.get(chave, _AUSENTE)
+            if valor is _AUSENTE:
+                return padrao
+            self._dados.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        tamanho = self._medir(valor) if self.max_bytes else 0
+        with self._lock:
+            if chave in self._dados:
+                self._bytes -= self._tamanhos.pop(chave, 0)
+                del self._dados[chave]
+            self._dados[chave] = valor
+            self._tamanhos[chave] = tamanho
+            self._bytes += tamanho
+            self._despejar()
+
+    def _despejar(self):
+        while self._dados and (len(self._dados) > self.max_itens
+                               or (self.max_bytes and self._bytes > self.max_bytes)):
+            chave, _ = self._dados.popitem(last=False)
+            self._bytes -= self._tamanhos.pop(chave, 0)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+            self._tamanhos.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._dados)
+
+    def __contains__(self, chave) -> bool:
+        """Presença da chave, sem mexer na ordem do LRU."""
+        with self._lock:
+            return chave in self._dados
+
+    def itens(self) -> list:
+        """Cópia de (chave, valor) do menos para o mais recente, sem mexer na ordem do LRU."""
+        with self._lock:
+            return list(self._dados.items())
+
+    @property
+    def bytes_usados(self) -> int:
+        return self._bytes
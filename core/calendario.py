@@ -0,0 +1,61 @@
+from functools import lru_cache
+from typing import Tuple
+from zoneinfo import ZoneInfo
+
+# Constante Global
+META_DIARIA = 8.0
+
+# Fuso do usuário (o banco guarda os instantes da auditoria em UTC)
+FUSO_SP = ZoneInfo("America/Sao_Paulo")
+
+# --- ENGENHARIA DE CALENDÁRIO (SP CAPITAL) ---
+@lru_cache(maxsize=32)
+def obter_feriados_sp(ano: int):
+    """
+    Retorna os feriados da Cidade de São Paulo (Capital).
+    Combina: Feriados BR + Feriados Estaduais SP + Aniversário de SP.
+    O resultado é memoizado por ano (antes era recriado a cada linha).
+    """
+    import holidays  # import pesado: só quando o calendário é realmente usado
+
+    # 1. Pega feriados Nacionais e Estaduais (SP)
+    br_holidays = holidays.BR(subdiv='SP', years=ano)
+
+    # 2. Adiciona Feriados Municipais (São Paulo Capital)
+    # 25 de Janeiro: Aniversário de São Paulo
+    br_holidays.append({f"{ano}-01-25": "Aniversário de São Paulo"})
+
+    # Corpus Christi (Móvel - geralmente a lib calcula, mas garantimos aqui se falhar)
+    # A lib 'holidays' geralmente já inclui Corpus Christi para BR, mas como ponto facultativo.
+    # Em SP capital é Feriado Municipal oficial.
+
+    # Consciência Negra (20/11) agora é Nacional, então a lib já traz.
+
+    return br_holidays
+
+def definir_meta(row) -> Tuple[float, str]:
+    import pandas as pd
+
+    feriado_manual = int(row.get('feriado_manual', 0))
+    data_str = str(row['data'])
+    data_dt = row['data_dt']
+
+    # 1. Prioridade: Feriado Manual (Override do usuário)
+    if feriado_manual == 1:
+        return 0.0, "Folga Manual"
+
+    # 2. Calendário Inteligente (SP Capital)
+    # Instancia os feriados para o ano da data específica
+    ano_data = data_dt.year
+    feriados_sp = obter_feriados_sp(ano_data)
+
+    if data_str in feriados_sp:
+        nome_feriado = feriados_sp.get(data_str)
+        return 0.0, f"Feriado ({nome_feriado})"
+
+    # 3. Fim de Semana
+    if pd.notnull(data_dt):
+        if data_dt.weekday() == 6: return 0.0, "Domingo"
+        if data_dt.weekday() == 5: return 0.0, "Sábado"
+
+    return META_DIARIA, "Dia Útil"
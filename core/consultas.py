@@ -0,0 +1,48 @@
+"""
+Consultas de um rerun do app, disparadas juntas num pool de threads.
+
+Sem Streamlit: o adaptador (`database.consultas_do_rerun`) e o script de
+medição (`medir_latencia.py`) usam exatamente este código.
+"""
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from core import armazenamento as arm
+from core import fechamento as fch
+from core.livro import Livro, RepositorioLivros
+
+def construtor_livro(engine, versao) -> Callable[[], Livro]:
+    def construir():
+        # Só roda quando a versão muda; checkpoints e registros vêm em paralelo
+        with ThreadPoolExecutor(max_workers=1) as extra:
+            acumulado = extra.submit(fch.acumulado_fechado, engine)
+            bruto = arm.carregar_dados(engine)
+            ultimo_fechado, acumulado, checkpoint = acumulado.result()
+        return Livro(bruto, versao, ultimo_fechado, acumulado, checkpoint=checkpoint)
+    return construir
+
+def disparar(pool: Executor, engine, repositorio: RepositorioLivros,
+             pronto: Optional[Future] = None) -> Dict[str, Future]:
+    """
+    Submete as consultas independentes do rerun e devolve Futures; quem usa
+    chama `.result()` só quando precisa. O tempo total fica perto da consulta
+    mais lenta, não da soma de todas. `pronto` = init_db em curso, se houver.
+    """
+    def apos_init(funcao, *args):
+        if pronto is not None:
+            pronto.result()  # tabelas criadas/migradas (instantâneo depois da primeira vez)
+        return funcao(*args)
+
+    def livro_da_versao():
+        v = versao.result()
+        return repositorio.obter(v, construtor_livro(engine, v))
+
+    # Cada tarefa só espera Futures submetidos antes dela (fila FIFO): o pool não trava
+    versao = pool.submit(apos_init, arm.versao_dados, engine)
+    return {
+        'versao': versao,
+        'livro': pool.submit(livro_da_versao),  # começa assim que a versão chega
+        'logs': pool.submit(apos_init, arm.buscar_logs, engine),
+        'meses_para_fechar': pool.submit(apos_init, fch.meses_para_fechar, engine),
+        'meses_fechados': pool.submit(apos_init, fch.meses_fechados, engine),
+    }
@@ -0,0 +1,11 @@
+import pandas as pd
+from io import BytesIO
+
+def to_excel(df):
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Ponto')
+        worksheet = writer.sheets['Ponto']
+        worksheet.set_column('A:A', 12)
+        worksheet.set_column('B:K', 10)
+    return output.getvalue()
@@ -0,0 +1,148 @@
+"""
+Fechamento de períodos (checkpoints mensais imutáveis).
+
+Fechar um mês congela os totais dele em `checkpoints_mensais` e trava edições
+no período. O balanço corrente passa a ser a soma dos checkpoints ativos mais
+os dias em aberto, sem reprocessar o histórico fechado.
+
+Os meses fechados formam sempre um prefixo contínuo da linha do tempo:
+fechar um mês fecha junto os anteriores em aberto, e reabrir um mês reabre
+também os seguintes. Reabrir não apaga nada, só marca `reaberto_em`.
+"""
+from datetime import date
+from typing import List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+
+from core import armazenamento as arm
+from core.resiliencia import com_retentativa
+from core.saldo import CAMPOS_ADITIVOS, processar_dataframe, resumir_balanco, somar_balancos
+
+SQL_MESES_COM_DADOS = text("SELECT DISTINCT substr(data, 1, 7) AS mes FROM registros ORDER BY mes")
+
+SQL_REGISTROS_PERIODO = text('''
+    SELECT * FROM registros
+    WHERE substr(data, 1, 7) > :apos AND substr(data, 1, 7) <= :ate
+''')
+
+SQL_ACUMULADO = text(f'''
+    SELECT MAX(mes) AS ultimo_mes, MAX(id) AS ultimo_checkpoint, {", ".join(f"COALESCE(SUM({c}), 0) AS {c}" for c in CAMPOS_ADITIVOS)}
+    FROM checkpoints_mensais
+    WHERE reaberto_em IS NULL
+''')
+
+SQL_MESES_FECHADOS = text("SELECT mes FROM checkpoints_mensais WHERE reaberto_em IS NULL ORDER BY mes")
+
+SQL_CHECKPOINTS = text("SELECT * FROM checkpoints_mensais ORDER BY mes, id")
+
+SQL_CHECKPOINTS_ATIVOS = text("SELECT * FROM checkpoints_mensais WHERE reaberto_em IS NULL ORDER BY mes")
+
+SQL_INSERIR_CHECKPOINT = text(f'''
+    INSERT INTO checkpoints_mensais (mes, {", ".join(CAMPOS_ADITIVOS)})
+    VALUES (:mes, {", ".join(f":{c}" for c in CAMPOS_ADITIVOS)})
+''')
+
+SQL_REABRIR = text('''
+    UPDATE checkpoints_mensais SET reaberto_em = CURRENT_TIMESTAMP
+    WHERE reaberto_em IS NULL AND mes >= :mes
+''')
+
+SQL_AUDIT_PERIODO = text('''
+    INSERT INTO audit_logs (acao, data_registro, detalhes)
+    VALUES (:acao, :mes, :det)
+''')
+
+def mes_atual() -> str:
+    return date.today().strftime('%Y-%m')
+
+@com_retentativa
+def meses_para_fechar(engine) -> List[str]:
+    """Meses com registros, ainda abertos e já encerrados no calendário."""
+    with engine.connect() as conn:
+        ultimo = arm.ultimo_mes_fechado(conn) or ''
+        meses = [m for (m,) in conn.execute(SQL_MESES_COM_DADOS)]
+    return [m for m in meses if ultimo < m < mes_atual()]
+
+@com_retentativa
+def meses_fechados(engine) -> List[str]:
+    """Meses com checkpoint ativo, do mais antigo para o mais recente."""
+    with engine.connect() as conn:
+        return [m for (m,) in conn.execute(SQL_MESES_FECHADOS)]
+
+def listar_checkpoints(engine) -> pd.DataFrame:
+    """Histórico completo, incluindo checkpoints reabertos."""
+    return pd.read_sql(SQL_CHECKPOINTS, engine)
+
+def checkpoints_ativos(engine) -> pd.DataFrame:
+    """Totais congelados dos meses fechados, um por mês."""
+    return pd.read_sql(SQL_CHECKPOINTS_ATIVOS, engine)
+
+@com_retentativa
+def acumulado_fechado(engine) -> Tuple[Optional[str], dict, Optional[int]]:
+    """
+    (último mês fechado, soma dos checkpoints ativos, id do checkpoint mais recente).
+    O id muda a cada fechamento: enquanto for o mesmo, os meses fechados não mudaram.
+    """
+    with engine.connect() as conn:
+        linha = conn.execute(SQL_ACUMULADO).mappings().one()
+    return linha['ultimo_mes'], {c: linha[c] for c in CAMPOS_ADITIVOS}, linha['ultimo_checkpoint']
+
+def balanco_consolidado(ultimo_mes: Optional[str], acumulado: dict, df_processado: pd.DataFrame) -> dict:
+    """Checkpoints + dias em aberto. `df_processado` pode conter o histórico todo: só os meses abertos entram."""
+    if not ultimo_mes:
+        return resumir_balanco(df_processado)
+    if df_processado.empty:
+        return somar_balancos(acumulado)
+    abertos = df_processado[df_processado['data'].astype(str).str[:7] > ultimo_mes]
+    return somar_balancos(acumulado, resumir_balanco(abertos))
+
+def fechar_ate(engine, mes: str) -> int:
+    """
+    Fecha todos os meses em aberto até `mes` (inclusive), um checkpoint por mês.
+    Retorna a nova versão dos dados.
+    """
+    if mes >= mes_atual():
+        raise ValueError("Só é possível fechar meses já encerrados.")
+
+    with engine.begin() as conn:
+        if engine.dialect.name == 'postgresql':
+            # Segura escritas em `registros` até o checkpoint ser gravado
+            conn.execute(text("LOCK TABLE registros IN SHARE MODE"))
+
+        ultimo = arm.ultimo_mes_fechado(conn)
+        if ultimo and mes <= ultimo:
+            raise ValueError(f"O período até {ultimo} já está fechado.")
+
+        df = pd.read_sql(SQL_REGISTROS_PERIODO, conn, params={'apos': ultimo or '', 'ate': mes})
+        linhas = []
+        if not df.empty:
+            df['mes'] = df['data'].astype(str).str[:7]
+            for m, grupo in df.groupby('mes', sort=True):
+                resumo = resumir_balanco(processar_dataframe(grupo.drop(columns=['mes'])))
+                linhas.append({'mes': m, **{c: resumo[c] for c in CAMPOS_ADITIVOS}})
+
+        # Sem registros no próprio mês: checkpoint zerado marca o fim do prefixo fechado
+        if not linhas or linhas[-1]['mes'] != mes:
+            linhas.append({'mes': mes, **{c: 0 for c in CAMPOS_ADITIVOS}})
+
+        conn.execute(SQL_INSERIR_CHECKPOINT, linhas)
+        conn.execute(SQL_AUDIT_PERIODO, {
+            'acao': 'FECHAR', 'mes': mes,
+            'det': f"Período fechado até {mes} ({len(linhas)} checkpoint(s))."
+        })
+        nova_versao = arm.avancar_versao(conn)  # último passo, como em toda escrita
+    return nova_versao
+
+def reabrir_a_partir(engine, mes: str) -> int:
+    """Reabre `mes` e todos os meses fechados depois dele. Retorna a nova versão dos dados."""
+    with engine.begin() as conn:
+        reabertos = conn.execute(SQL_REABRIR, {'mes': mes}).rowcount
+        if not reabertos:
+            raise ValueError(f"Nenhum período fechado a partir de {mes}.")
+        conn.execute(SQL_AUDIT_PERIODO, {
+            'acao': 'REABRIR', 'mes': mes,
+            'det': f"Período reaberto a partir de {mes} ({reabertos} checkpoint(s))."
+        })
+        nova_versao = arm.avancar_versao(conn)
+    return nova_versao
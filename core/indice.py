@@ -0,0 +1,120 @@
+"""
+Registros em memória indexados por data.
+
+Substitui as varreduras do formulário (`df[df['data'] == ...]`) e as
+ordenações repetidas dos seletores: busca pontual O(1), lista de datas já
+ordenada e mantida incrementalmente, e horários convertidos uma única vez.
+"""
+import bisect
+from datetime import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from core.validacao import horarios_em_minutos
+
+CAMPOS_HORARIO = ['entrada', 'almoco_ida', 'almoco_volta', 'saida', 'extra_inicio', 'extra_fim']
+
+def _minutos_para_time(minutos: float) -> Optional[time]:
+    if minutos is None or np.isnan(minutos): return None
+    minutos = int(minutos)
+    return time(minutos // 60, minutos % 60)
+
+def _chave(data) -> str:
+    """Normaliza date/Timestamp/str para 'AAAA-MM-DD' (formato da coluna `data`)."""
+    if isinstance(data, str): return data[:10]
+    return pd.Timestamp(data).strftime('%Y-%m-%d')
+
+class IndiceRegistros:
+    """
+    Cópia indexada de `registros` para a aba de Lançamento.
+
+    `versao` identifica o estado do banco que originou o índice (ver
+    `armazenamento.versao_dados`); quem usa compara com a versão atual para
+    decidir entre reaproveitar, atualizar incrementalmente ou reconstruir.
+    """
+
+    def __init__(self, df: pd.DataFrame, versao=None):
+        self.versao = versao
+        self._linhas = {}
+        self._datas = []          # crescente, mantida com bisect
+        self._datas_desc = None   # cache da lista decrescente
+
+        if df is None or df.empty:
+            return
+
+        df = df.drop_duplicates('data', keep='last')
+        # Horários convertidos de uma vez (vetorizado) e guardados como datetime.time
+        for campo in CAMPOS_HORARIO:
+            if campo in df.columns:
+                convertidos = [_minutos_para_time(m) for m in horarios_em_minutos(df[campo])]
+                df = df.assign(**{f't_{campo}': convertidos})
+
+        self._linhas = {str(d)[:10]: linha for d, linha in zip(df['data'], df.to_dict('records'))}
+        self._datas = sorted(self._linhas)
+
+    # --- LEITURA ---
+    def buscar(self, data) -> Optional[dict]:
+        """Registro do dia (com campos `t_*` já em datetime.time) ou None."""
+        return self._linhas.get(_chave(data))
+
+    def __contains__(self, data) -> bool:
+        return _chave(data) in self._linhas
+
+    def __len__(self) -> int:
+        return len(self._datas)
+
+    @property
+    def vazio(self) -> bool:
+        return not self._datas
+
+    @property
+    def datas_desc(self) -> list:
+        """Datas 'AAAA-MM-DD' da mais recente para a mais antiga (para os seletores)."""
+        if self._datas_desc is None:
+            self._datas_desc = self._datas[::-1]
+        return self._datas_desc
+
+    def copia(self) -> 'IndiceRegistros':
+        """Cópia rasa (linhas compartilhadas, estrutura própria) para derivar sem alterar este índice."""
+        novo = IndiceRegistros(None, self.versao)
+        novo._linhas = dict(self._linhas)
+        novo._datas = list(self._datas)
+        return novo
+
+    # --- MANUTENÇÃO INCREMENTAL ---
+    def _sincronizar_versao(self, nova_versao):
+        # Só avança se a nova versão é a imediatamente seguinte; senão alguém
+        # escreveu no meio do caminho e o índice fica marcado para reconstrução.
+        if nova_versao is None: return
+        if isinstance(self.versao, int) and nova_versao == self.versao + 1:
+            self.versao = nova_versao
+        else:
+            self.versao = None
+
+    def _invalidar_caches(self):
+        self._datas_desc = None
+
+    def gravar(self, linha: dict, nova_versao=None):
+        """Insere/atualiza um dia após um salvamento bem-sucedido."""
+        chave = _chave(linha['data'])
+        linha = dict(linha, data=chave)
+        for campo in CAMPOS_HORARIO:
+            if campo in linha:
+                linha[f't_{campo}'] = _minutos_para_time(horarios_em_minutos(pd.Series([linha[campo]]))[0])
+
+        if chave not in self._linhas:
+            bisect.insort(self._datas, chave)
+        self._linhas[chave] = linha
+        self._invalidar_caches()
+        self._sincronizar_versao(nova_versao)
+
+    def remover(self, data, nova_versao=None):
+        """Remove um dia após uma exclusão bem-sucedida."""
+        chave = _chave(data)
+        if self._linhas.pop(chave, None) is not None:
+            pos = bisect.bisect_left(self._datas, chave)
+            del self._datas[pos]
+            self._invalidar_caches()
+        self._sincronizar_versao(nova_versao)
@@ -0,0 +1,274 @@
+"""
+Ingestão de batidas avulsas (terminais de crachá).
+
+Cada evento traz um único horário (`entrada`, `almoco_ida`, `almoco_volta`
+ou `saida`) de um dia. Os eventos entram num buffer em memória que já os
+consolida por dia (última batida de cada campo vence) e são gravados em
+lote: uma transação por descarga, com um único SELECT das linhas afetadas,
+um executemany do upsert e um executemany da auditoria — em vez de uma
+transação por batida.
+
+As regras de escrita são as mesmas do formulário: meses fechados não são
+alterados e cada dia gravado gera um evento de auditoria com diff. Batidas
+de mês fechado são recusadas na recepção (`dias_em_periodo_fechado`); as que
+escapam disso (mês fechado entre a recepção e a descarga) ficam registradas
+na auditoria como BATIDA_RECUSADA, nunca somem em silêncio.
+"""
+import re
+import threading
+import time
+from datetime import date, datetime
+from typing import Iterable
+
+from sqlalchemy import bindparam, text
+
+from core import armazenamento as arm
+from core import auditoria as aud
+
+CAMPOS_BATIDA = ('entrada', 'almoco_ida', 'almoco_volta', 'saida')
+
+# Campos de um dia novo que a batida não preenche (mesmo padrão do formulário)
+LINHA_VAZIA = {
+    'entrada': '00:00:00', 'almoco_ida': '00:00:00', 'almoco_volta': '00:00:00', 'saida': '00:00:00',
+    'extra_inicio': '00:00:00', 'extra_fim': '00:00:00', 'obs': '', 'feriado_manual': 0, 'home_office': 0,
+}
+
+_RE_HORA = re.compile(r'^([01]?\d|2[0-3]):([0-5]\d)(?::([0-5]\d))?$')
+
+SQL_LER_DIAS = text("SELECT * FROM registros WHERE data IN :datas").bindparams(
+    bindparam('datas', expanding=True))
+SQL_LER_DIAS_TRAVANDO = text("SELECT * FROM registros WHERE data IN :datas FOR UPDATE").bindparams(
+    bindparam('datas', expanding=True))
+
+SQL_TRAVAR_ESCRITA = text("LOCK TABLE registros IN ROW EXCLUSIVE MODE")
+
+SQL_AUDIT_BATIDA = text('''
+    INSERT INTO audit_logs (acao, data_registro, detalhes, diff)
+    VALUES ('BATIDA', :d, :det, :diff)
+''')
+
+# Sem diff: não entra na reconstrução da viagem no tempo
+SQL_AUDIT_BATIDA_RECUSADA = text('''
+    INSERT INTO audit_logs (acao, data_registro, detalhes)
+    VALUES ('BATIDA_RECUSADA', :d, :det)
+''')
+
+class EventoInvalidoError(ValueError):
+    """Batida com tipo, data ou hora fora do formato esperado."""
+
+# --- NORMALIZAÇÃO ---
+def normalizar_evento(evento: dict) -> tuple:
+    """
+    Converte o JSON recebido em (data 'AAAA-MM-DD', campo, hora 'HH:MM:SS').
+    Aceita {"tipo", "data", "hora"} ou {"tipo", "momento": "AAAA-MM-DDTHH:MM[:SS]"}.
+    """
+    if not isinstance(evento, dict):
+        raise EventoInvalidoError("Evento deve ser um objeto JSON.")
+    tipo = evento.get('tipo')
+    if tipo not in CAMPOS_BATIDA:
+        raise EventoInvalidoError(f"Tipo inválido: {tipo!r}. Use um de {', '.join(CAMPOS_BATIDA)}.")
+
+    if evento.get('momento'):
+        try:
+            momento = datetime.fromisoformat(str(evento['momento']))
+        except ValueError:
+            raise EventoInvalidoError(f"Momento inválido: {evento['momento']!r}.")
+        return momento.strftime('%Y-%m-%d'), tipo, momento.strftime('%H:%M:%S')
+
+    try:
+        dia = date.fromisoformat(str(evento.get('data'))[:10]).isoformat()
+    except ValueError:
+        raise EventoInvalidoError(f"Data inválida: {evento.get('data')!r}.")
+    casamento = _RE_HORA.match(str(evento.get('hora', '')).strip())
+    if not casamento:
+        raise EventoInvalidoError(f"Hora inválida: {evento.get('hora')!r}.")
+    h, m, s = casamento.groups()
+    return dia, tipo, f"{int(h):02d}:{m}:{s or '00'}"
+
+def dias_em_periodo_fechado(eventos: Iterable[tuple], ultimo_fechado: str) -> list:
+    """Dias (ordenados) dos eventos normalizados que caem em mês fechado. Vazio se nenhum."""
+    if not ultimo_fechado:
+        return []
+    return sorted({dia for dia, _, _ in eventos if dia[:7] <= ultimo_fechado})
+
+# --- BUFFER ---
+class BufferBatidas:
+    """
+    Buffer thread-safe que consolida batidas por dia.
+
+    `adicionar` só mexe num dict sob lock (barato, chamado pelas threads do
+    servidor); `descarregar` troca o dict inteiro por um vazio e grava o
+    lote fora do lock, então a recepção nunca espera o banco.
+    """
+
+    def __init__(self, limite_lote: int = 5_000, max_pendentes: int = 50_000):
+        self.limite_lote = limite_lote
+        self.max_pendentes = max_pendentes
+        self._dias = {}          # data -> {campo: hora}
+        self._eventos = 0        # batidas recebidas desde a última descarga
+        self._lock = threading.Lock()
+        self.cheio = threading.Event()  # sinaliza a descarga antecipada
+
+    def __len__(self) -> int:
+        return self._eventos
+
+    def adicionar(self, eventos: Iterable[tuple]) -> bool:
+        """Enfileira eventos já normalizados. False se o buffer está lotado (quem chama devolve 503)."""
+        eventos = list(eventos)
+        with self._lock:
+            if self._eventos + len(eventos) > self.max_pendentes:
+                return False
+            for dia, campo, hora in eventos:
+                self._dias.setdefault(dia, {})[campo] = hora
+            self._eventos += len(eventos)
+            if self._eventos >= self.limite_lote:
+                self.cheio.set()
+        return True
+
+    def retirar(self) -> tuple:
+        """(dias consolidados, nº de eventos) e zera o buffer."""
+        with self._lock:
+            dias, eventos = self._dias, self._eventos
+            self._dias, self._eventos = {}, 0
+            self.cheio.clear()
+        return dias, eventos
+
+    def devolver(self, dias: dict, eventos: int):
+        """Recoloca um lote que falhou; batidas mais novas do mesmo campo continuam valendo."""
+        with self._lock:
+            for dia, campos in dias.items():
+                atuais = self._dias.setdefault(dia, {})
+                for campo, hora in campos.items():
+                    atuais.setdefault(campo, hora)
+            self._eventos += eventos
+
+# --- GRAVAÇÃO EM LOTE ---
+def gravar_lote(engine, dias: dict) -> dict:
+    """
+    Aplica as batidas consolidadas numa única transação.
+    Retorna {'gravados', 'ignorados_fechados', 'versao', 'ultimo_fechado'}; dias de meses
+    fechados não são gravados, só registrados na auditoria como BATIDA_RECUSADA.
+    """
+    resultado = {'gravados': 0, 'ignorados_fechados': 0, 'versao': None, 'ultimo_fechado': None}
+    if not dias:
+        return resultado
+
+    with engine.connect() as conn, conn.begin() as transacao:
+        if engine.dialect.name == 'postgresql':
+            # ROW EXCLUSIVE (o lock de todo UPDATE) conflita com o SHARE de `fechar_ate`:
+            # um fechamento em curso termina antes de lermos o checkpoint abaixo e nenhum
+            # começa até o commit. Só o FOR UPDATE (ROW SHARE) não bastaria.
+            conn.execute(SQL_TRAVAR_ESCRITA)
+            atuais = conn.execute(SQL_LER_DIAS_TRAVANDO, {'datas': sorted(dias)}).mappings().all()
+        else:
+            atuais = conn.execute(SQL_LER_DIAS, {'datas': sorted(dias)}).mappings().all()
+        atuais = {str(linha['data'])[:10]: aud.linha_para_dict(linha) for linha in atuais}
+
+        ultimo_fechado = arm.ultimo_mes_fechado(conn) or ''
+        resultado['ultimo_fechado'] = ultimo_fechado
+        upserts, auditorias, recusas = [], [], []
+        for dia in sorted(dias):
+            if dia[:7] <= ultimo_fechado:
+                resultado['ignorados_fechados'] += 1
+                campos = ", ".join(f"{c}: {h}" for c, h in sorted(dias[dia].items()))
+                recusas.append({'d': dia, 'det': f"Batida via terminal recusada: período fechado até "
+                                                 f"{ultimo_fechado}. {campos}"})
+                continue
+            antes = atuais.get(dia)
+            depois = {**(antes or LINHA_VAZIA), **dias[dia]}
+            diff = aud.calcular_diff(antes, depois)
+            if antes is not None and not diff['depois']:
+                continue  # batida repetida: nada mudou, nada a gravar
+            upserts.append({
+                'data': dia, 'ent': depois['entrada'], 'ai': depois['almoco_ida'], 'av': depois['almoco_volta'],
+                'sai': depois['saida'], 'ei': depois['extra_inicio'], 'ef': depois['extra_fim'],
+                'obs': depois['obs'], 'fer': depois['feriado_manual'], 'ho': depois['home_office'],
+            })
+            auditorias.append({'d': dia, 'det': "Batida via terminal. " + aud.descrever(diff),
+                               'diff': aud.serializar(diff)})
+
+        resultado['gravados'] = len(upserts)
+        if recusas:
+            conn.execute(SQL_AUDIT_BATIDA_RECUSADA, recusas)
+        if not upserts:
+            if not recusas:
+                transacao.rollback()
+            return resultado  # `registros` não mudou: a versão dos dados não avança
+        conn.execute(arm.SQL_UPSERT_REGISTRO, upserts)
+        conn.execute(SQL_AUDIT_BATIDA, auditorias)
+        log_id = conn.execute(aud.SQL_MAX_LOG).scalar()
+        resultado['versao'] = arm.avancar_versao(conn, [u['data'] for u in upserts])  # último passo, como em toda escrita
+
+    aud.snapshot_se_necessario(engine, log_id)
+    return resultado
+
+# --- DESCARGA PERIÓDICA ---
+class Descarregador(threading.Thread):
+    """
+    Thread que esvazia o buffer a cada `intervalo` segundos, ou antes se
+    ele atingir `limite_lote` eventos. Falhas devolvem o lote ao buffer.
+    """
+
+    def __init__(self, engine, buffer: BufferBatidas, intervalo: float = 0.5):
+        super().__init__(name="descarga-batidas", daemon=True)
+        self.engine = engine
+        self.buffer = buffer
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self.estatisticas = {'eventos': 0, 'dias_gravados': 0, 'ignorados_fechados': 0,
+                             'descargas': 0, 'falhas': 0, 'ultima_versao': None}
+        self._ultimo_fechado = ''
+        self._fechado_lido_em = float('-inf')
+        self._lock_fechado = threading.Lock()
+
+    def ultimo_fechado(self, validade: float = 5.0) -> str:
+        """
+        Último mês fechado ('' se nenhum) para a checagem na recepção. Vem da última
+        descarga ou, se mais velho que `validade` segundos, é relido do banco. Banco
+        fora: fica o valor conhecido (a descarga ainda barra e audita o que escapar).
+        """
+        with self._lock_fechado:
+            if time.monotonic() - self._fechado_lido_em > validade:
+                try:
+                    with self.engine.connect() as conn:
+                        self._ultimo_fechado = arm.ultimo_mes_fechado(conn) or ''
+                except Exception:
+                    pass
+                self._fechado_lido_em = time.monotonic()
+            return self._ultimo_fechado
+
+    def descarregar(self) -> int:
+        dias, eventos = self.buffer.retirar()
+        if not eventos:
+            return 0
+        try:
+            resultado = gravar_lote(self.engine, dias)
+        except Exception:
+            self.buffer.devolver(dias, eventos)
+            self.estatisticas['falhas'] += 1
+            raise
+        self.estatisticas['eventos'] += eventos
+        self.estatisticas['dias_gravados'] += resultado['gravados']
+        self.estatisticas['ignorados_fechados'] += resultado['ignorados_fechados']
+        self.estatisticas['descargas'] += 1
+        if resultado['ultimo_fechado'] is not None:
+            with self._lock_fechado:
+                self._ultimo_fechado, self._fechado_lido_em = resultado['ultimo_fechado'], time.monotonic()
+        if resultado['versao'] is not None:
+            self.estatisticas['ultima_versao'] = resultado['versao']
+        return eventos
+
+    def run(self):
+        while not self._parar.is_set():
+            self.buffer.cheio.wait(self.intervalo)
+            try:
+                self.descarregar()
+            except Exception:
+                time.sleep(self.intervalo)  # banco fora: o lote voltou ao buffer, tenta na próxima volta
+
+    def parar(self, timeout: float = 10.0):
+        """Encerra a thread e grava o que ainda estiver no buffer."""
+        self._parar.set()
+        self.buffer.cheio.set()
+        self.join(timeout)
+        self.descarregar()
@@ -0,0 +1,212 @@
+"""
+Livro-razão processado, compartilhado entre sessões.
+
+Um `Livro` é a fotografia imutável de `registros` numa versão dos dados
+(ver `armazenamento.versao_dados`): o DataFrame bruto, o índice do
+formulário, o extrato processado e as inconsistências, cada um calculado
+uma única vez e sob demanda. Como nada nele muda depois de pronto, uma
+única instância atende todas as sessões do processo; quem precisa alterar
+um DataFrame faz `.copy()` antes.
+
+O extrato é processado em duas partes: os meses fechados (imutáveis
+enquanto o mesmo checkpoint estiver ativo) e os meses em aberto. Os KPIs
+só usam a parte aberta; a fechada, necessária ao extrato e ao analytics,
+é herdada entre versões em vez de reprocessada.
+
+`RepositorioLivros` guarda os livros das versões recentes (LRU) e garante
+que cada versão seja construída uma vez só, mesmo com várias sessões
+pedindo ao mesmo tempo.
+"""
+import sys
+import threading
+from typing import Callable, Optional
+
+import pandas as pd
+
+from core.cache import CacheLRU
+from core.calendario import definir_meta
+from core.indice import IndiceRegistros
+from core.saldo import processar_dataframe
+from core.validacao import validar_lote
+
+class Livro:
+    """Estado processado de uma versão dos dados. Não altere os DataFrames devolvidos."""
+
+    def __init__(self, bruto: pd.DataFrame, versao=None, ultimo_fechado: Optional[str] = None,
+                 acumulado_fechado: Optional[dict] = None, indice: Optional[IndiceRegistros] = None,
+                 checkpoint=None, fechado: Optional[pd.DataFrame] = None):
+        self.versao = versao
+        self.bruto = bruto
+        self.ultimo_fechado = ultimo_fechado
+        self.acumulado_fechado = acumulado_fechado
+        self.checkpoint = checkpoint  # id do último checkpoint ativo: identifica os meses fechados
+        self._indice = indice
+        self._fechado = fechado
+        self._aberto = None
+        self._processado = None
+        self._inconsistencias = None
+        self._lock = threading.Lock()  # sessões simultâneas calculam cada parte uma vez só
+
+    @property
+    def vazio(self) -> bool:
+        return self.bruto.empty
+
+    @property
+    def indice(self) -> IndiceRegistros:
+        if self._indice is None:
+            with self._lock:
+                if self._indice is None:
+                    self._indice = IndiceRegistros(self.bruto, versao=self.versao)
+        return self._indice
+
+    def _meses_fechados(self) -> pd.Series:
+        if not self.ultimo_fechado or self.bruto.empty:
+            return pd.Series(False, index=self.bruto.index)
+        return self.bruto['data'].astype(str).str[:7] <= self.ultimo_fechado
+
+    @staticmethod
+    def _processar(bruto: pd.DataFrame) -> pd.DataFrame:
+        df = processar_dataframe(bruto)
+        if not df.empty:
+            df[['meta', 'motivo']] = df.apply(definir_meta, axis=1, result_type='expand')
+            df['saldo'] = df['total_trabalhado'] - df['meta']
+        return df
+
+    @property
+    def processado_fechado(self) -> pd.DataFrame:
+        """Extrato dos meses fechados (herdado do livro anterior quando o checkpoint é o mesmo)."""
+        if self._fechado is None:
+            with self._lock:
+                if self._fechado is None:
+                    self._fechado = self._processar(self.bruto[self._meses_fechados()])
+        return self._fechado
+
+    @property
+    def processado_aberto(self) -> pd.DataFrame:
+        """Extrato só dos meses em aberto: é o que os KPIs somam aos checkpoints."""
+        if self._aberto is None:
+            with self._lock:
+                if self._aberto is None:
+                    self._aberto = self._processar(self.bruto[~self._meses_fechados()])
+        return self._aberto
+
+    @property
+    def processado(self) -> pd.DataFrame:
+        """Extrato completo com horas, meta/motivo do dia e saldo simples (total - meta)."""
+        if self._processado is None:
+            fechado, aberto = self.processado_fechado, self.processado_aberto
+            with self._lock:
+                if self._processado is None:
+                    partes = [p for p in (fechado, aberto) if not p.empty]
+                    if len(partes) > 1:
+                        self._processado = pd.concat(partes).sort_values('data', kind='stable').reset_index(drop=True)
+                    else:
+                        self._processado = partes[0] if partes else aberto
+        return self._processado
+
+    @property
+    def inconsistencias(self) -> pd.DataFrame:
+        if self._inconsistencias is None:
+            with self._lock:
+                if self._inconsistencias is None:
+                    self._inconsistencias = validar_lote(self.bruto)
+        return self._inconsistencias
+
+    # --- DERIVAÇÃO (SEM RELER O BANCO) ---
+    def com_gravacao(self, linha: dict, nova_versao) -> 'Livro':
+        """Novo livro com o dia gravado; este continua intacto para quem ainda o usa."""
+        chave = str(linha['data'])[:10]
+        nova = pd.DataFrame([dict(linha, data=chave)])
+        if self.bruto.empty:
+            bruto = nova
+        else:
+            resto = self.bruto[self.bruto['data'].astype(str).str[:10] != chave]
+            bruto = pd.concat([resto, nova], ignore_index=True)
+        indice = self.indice.copia()
+        indice.gravar(linha, nova_versao)
+        # Gravações só alcançam meses em aberto: a parte fechada continua valendo
+        return Livro(bruto, nova_versao, self.ultimo_fechado, self.acumulado_fechado, indice,
+                     self.checkpoint, self._fechado)
+
+    def com_exclusao(self, data, nova_versao) -> 'Livro':
+        chave = str(data)[:10]
+        bruto = self.bruto[self.bruto['data'].astype(str).str[:10] != chave].reset_index(drop=True)
+        indice = self.indice.copia()
+        indice.remover(chave, nova_versao)
+        return Livro(bruto, nova_versao, self.ultimo_fechado, self.acumulado_fechado, indice,
+                     self.checkpoint, self._fechado)
+
+    # --- MEMÓRIA ---
+    def bytes_usados(self) -> int:
+        """Estimativa (pandas deep) do que já foi materializado neste livro."""
+        total = int(self.bruto.memory_usage(deep=True).sum())
+        for parte in (self._fechado, self._aberto, self._processado, self._inconsistencias):
+            if parte is not None:
+                total += int(parte.memory_usage(deep=True).sum())
+        if self._indice is not None:
+            total += sys.getsizeof(self._indice._linhas) + sum(sys.getsizeof(l) for l in self._indice._linhas.values())
+        return total
+
+class RepositorioLivros:
+    """LRU de livros por versão, com construção única por versão."""
+
+    def __init__(self, max_versoes: int = 4):
+        self._cache = CacheLRU(max_itens=max_versoes)
+        self._lock = threading.Lock()
+        self._construindo = {}  # versao -> Lock da construção em curso
+
+    def obter(self, versao, construir: Callable[[], Livro]) -> Livro:
+        livro = self._cache.get(versao)
+        if livro is not None:
+            return livro
+        with self._lock:
+            trava = self._construindo.setdefault(versao, threading.Lock())
+        with trava:
+            livro = self._cache.get(versao)  # outra sessão pode ter construído enquanto esperávamos
+            if livro is None:
+                livro = construir()
+                self._herdar_fechado(livro)
+                self._cache.set(versao, livro)
+        with self._lock:
+            self._construindo.pop(versao, None)
+        return livro
+
+    def _herdar_fechado(self, livro: Livro):
+        """Reaproveita o extrato dos meses fechados de um livro em cache com o mesmo checkpoint."""
+        if livro.checkpoint is None or livro._fechado is not None:
+            return
+        for _, outro in reversed(self._cache.itens()):
+            if outro.checkpoint == livro.checkpoint and outro._fechado is not None:
+                livro._fechado = outro._fechado
+                return
+
+    def publicar(self, livro: Livro):
+        """Registra um livro derivado localmente (após gravação) sob a versão dele."""
+        if livro.versao is not None:
+            self._cache.set(livro.versao, livro)
+
+    def clear(self):
+        self._cache.clear()
+
+    def resumo(self) -> dict:
+        versoes = self._cache.itens()
+        return {
+            'versoes': [v for v, _ in versoes],
+            'bytes': sum(l.bytes_usados() for _, l in versoes),
+        }
+
+def memoria_processo() -> Optional[int]:
+    """RSS atual do processo em bytes (Linux), ou o pico via `resource`; None se indisponível."""
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return pico if sys.platform == 'darwin' else pico * 1024  # macOS em bytes, Linux em KiB
+    except (ImportError, OSError):
+        return None
@@ -0,0 +1,190 @@
+"""
+Projeção "e se" do banco de horas.
+
+Um candidato é uma jornada semanal: para cada dia da semana (0 = segunda),
+os horários de entrada, almoço ida/volta e saída. Todos os candidatos são
+avaliados juntos sobre as datas futuras numa única conta NumPy:
+
+    horas[C, 7] -> horas[C, 14] (dia da semana × feriado) -> saldo final = (horas - meta) · contagem
+    curva[D] = saldo inicial + cumsum(horas[classe do dia] - meta[dia]), só para quem for exibido
+
+As regras são as de `core.saldo.processar_dataframe`: virada de meia-noite,
+meta 0 em sábados, domingos e feriados de SP, e peso 1,5 (sábado) / 2,0
+(domingo e feriado) nos créditos. Por padrão a jornada não é cumprida em
+feriados.
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from core.calendario import META_DIARIA, obter_feriados_sp
+
+NOMES_DIAS = ('Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo')
+
+# Jornada comercial padrão (09-18 com 1h de almoço) de segunda a sexta
+JORNADA_PADRAO = {d: ('09:00', '12:00', '13:00', '18:00') for d in range(5)}
+
+MINUTOS_DIA = 24 * 60
+
+def _minutos(hora) -> int:
+    """'HH:MM[:SS]' ou datetime.time -> minutos desde 00:00."""
+    if hasattr(hora, 'hour'):
+        return hora.hour * 60 + hora.minute
+    h, m = str(hora).split(':')[:2]
+    return int(h) * 60 + int(m)
+
+def _hhmm(minutos: int) -> str:
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+# --- CALENDÁRIO FUTURO ---
+@dataclass
+class Calendario:
+    datas: np.ndarray        # datetime64[D], shape (D,)
+    dia_semana: np.ndarray   # 0..6
+    feriado: np.ndarray      # bool
+    meta: np.ndarray         # horas devidas no dia
+    peso: np.ndarray         # multiplicador dos créditos
+
+def montar_calendario(inicio: date, fim: date, folgas: Sequence[date] = ()) -> Calendario:
+    """Datas de `inicio` a `fim` (inclusive) com meta e peso de cada dia. `folgas` = feriados manuais."""
+    datas = np.arange(np.datetime64(inicio, 'D'), np.datetime64(fim, 'D') + 1)
+    # 1970-01-01 foi quinta-feira (3 com segunda = 0)
+    dia_semana = (datas.astype('int64') + 3) % 7
+
+    feriados = [np.datetime64(d, 'D') for ano in range(inicio.year, fim.year + 1) for d in obter_feriados_sp(ano)]
+    feriado = np.isin(datas, np.array(feriados + [np.datetime64(d, 'D') for d in folgas], dtype='datetime64[D]'))
+
+    fim_de_semana = dia_semana >= 5
+    meta = np.where(feriado | fim_de_semana, 0.0, META_DIARIA)
+    peso = np.select([feriado | (dia_semana == 6), dia_semana == 5], [2.0, 1.5], 1.0)
+    return Calendario(datas, dia_semana, feriado, meta, peso)
+
+# --- CANDIDATOS ---
+def jornada_para_matriz(jornada: Dict[int, Sequence]) -> np.ndarray:
+    """{dia_semana: (entrada, almoco_ida, almoco_volta, saida)} -> minutos, shape (7, 4). Dia ausente = folga."""
+    matriz = np.zeros((7, 4), dtype=np.int32)
+    for dia, horarios in jornada.items():
+        matriz[dia] = [_minutos(h) for h in horarios]
+    return matriz
+
+def grade_candidatos(base: Dict[int, Sequence], saidas: Dict[int, Sequence]) -> np.ndarray:
+    """
+    Todas as combinações de horário de saída por dia da semana sobre a jornada `base`.
+    Ex.: 5 dias × 7 opções = 16.807 candidatos. Retorna minutos, shape (C, 7, 4).
+    """
+    matriz = jornada_para_matriz(base)
+    dias = sorted(saidas)
+    opcoes = [np.array([_minutos(h) for h in saidas[d]], dtype=np.int32) for d in dias]
+    if not dias:
+        return matriz[None]
+
+    # Produto cartesiano vetorizado: uma coluna por dia variado
+    grade = np.stack(np.meshgrid(*opcoes, indexing='ij'), axis=-1).reshape(-1, len(dias))
+    candidatos = np.repeat(matriz[None], len(grade), axis=0)
+    candidatos[:, dias, 3] = grade
+    return candidatos
+
+def horas_por_dia_semana(candidatos: np.ndarray) -> np.ndarray:
+    """Horas trabalhadas por dia da semana, shape (C, 7), com as regras de virada do motor de saldo."""
+    ent, ai, av, sai = (candidatos[..., i] for i in range(4))
+    # Turno que vira a meia-noite (saída < entrada; saída 00:00 = não trabalhou)
+    virada = (sai < ent) & (sai > 0)
+    jornada = sai + virada * MINUTOS_DIA - ent
+    pausa = av - ai
+    pausa = pausa + (virada & (pausa < 0)) * MINUTOS_DIA
+    horas = (jornada - pausa) / 60.0
+    return np.where(sai == 0, 0.0, horas)  # falta ou turno em aberto
+
+# --- PROJEÇÃO ---
+@dataclass
+class Projecao:
+    calendario: Calendario
+    saldo_inicial: float
+    horas_dia: np.ndarray      # (C, 14) horas por classe de dia (dia da semana × feriado)
+    saldo_final: np.ndarray    # (C,)
+    creditos: np.ndarray       # (C,) créditos com peso (só dias com saldo positivo)
+    dias_folga: np.ndarray     # (C,) saldo final convertido em dias (saldo / META_DIARIA)
+    folgas_ganhas: np.ndarray  # (C,) dias inteiros de folga a mais que o saldo inicial
+    candidatos: np.ndarray     # (C, 7, 4) minutos
+
+    def __len__(self) -> int:
+        return len(self.saldo_final)
+
+    def curvas(self, indices: Sequence[int]) -> np.ndarray:
+        """Saldo acumulado dia a dia dos candidatos pedidos, shape (len(indices), D)."""
+        cal = self.calendario
+        classe = cal.dia_semana + 7 * cal.feriado
+        saldo_dia = self.horas_dia[np.asarray(indices)][:, classe] - cal.meta
+        return self.saldo_inicial + np.cumsum(saldo_dia, axis=1)
+
+    def curva(self, i: int = 0) -> pd.DataFrame:
+        """Curva de um candidato, pronta para gráfico."""
+        return pd.DataFrame({'data': pd.to_datetime(self.calendario.datas), 'saldo': self.curvas([i])[0]})
+
+    def jornada(self, i: int) -> Dict[str, str]:
+        """Horários de saída do candidato `i` por dia da semana trabalhado."""
+        c = self.candidatos[i]
+        return {NOMES_DIAS[d]: _hhmm(int(c[d, 3])) for d in range(7) if c[d].any()}
+
+def projetar(candidatos: np.ndarray, inicio: date, fim: date, saldo_inicial: float = 0.0,
+             folgas: Sequence[date] = (), trabalha_feriados: bool = False) -> Projecao:
+    """
+    Avalia todos os candidatos (C, 7, 4) de `inicio` a `fim` numa única passada.
+    `folgas` entram como feriado manual (meta 0, sem trabalho).
+
+    Como as horas só dependem do dia da semana, as D datas viram 14 classes
+    (dia da semana × feriado) com contagem, meta e peso: o saldo final é um
+    produto (C, 14) · (14,), independente do tamanho do período. As curvas dia
+    a dia só são montadas para os candidatos exibidos (`Projecao.curvas`).
+    """
+    cal = montar_calendario(inicio, fim, folgas)
+    classe = cal.dia_semana + 7 * cal.feriado
+    contagem = np.bincount(classe, minlength=14).astype(float)
+    meta_classe = np.bincount(classe, weights=cal.meta, minlength=14) / np.maximum(contagem, 1)
+    peso_classe = np.bincount(classe, weights=cal.peso, minlength=14) / np.maximum(contagem, 1)
+
+    por_semana = horas_por_dia_semana(candidatos)                 # (C, 7)
+    horas_dia = np.concatenate([por_semana, por_semana], axis=1)  # (C, 14): normal | feriado
+    if not trabalha_feriados:
+        horas_dia[:, 7:] = 0.0
+
+    saldo_classe = horas_dia - meta_classe                        # (C, 14)
+    saldo_final = saldo_inicial + saldo_classe @ contagem
+    creditos = (np.maximum(saldo_classe, 0.0) * peso_classe) @ contagem
+
+    ganho = saldo_final - saldo_inicial
+    return Projecao(
+        calendario=cal,
+        saldo_inicial=saldo_inicial,
+        horas_dia=horas_dia,
+        saldo_final=saldo_final,
+        creditos=creditos,
+        dias_folga=saldo_final / META_DIARIA,
+        folgas_ganhas=np.floor(np.maximum(ganho, 0.0) / META_DIARIA).astype(int),
+        candidatos=candidatos,
+    )
+
+def melhores(projecao: Projecao, saldo_alvo: Optional[float] = None, n: int = 10) -> pd.DataFrame:
+    """
+    Ranking dos candidatos. Com `saldo_alvo`, fica com os que chegam nele
+    trabalhando menos (menor saldo final que ainda bate o alvo); sem alvo, os de maior saldo.
+    """
+    idx = np.arange(len(projecao))
+    if saldo_alvo is not None:
+        idx = idx[projecao.saldo_final >= saldo_alvo]
+        ordem = idx[np.argsort(projecao.saldo_final[idx], kind='stable')]
+    else:
+        ordem = idx[np.argsort(-projecao.saldo_final, kind='stable')]
+
+    linhas: List[dict] = []
+    for i in ordem[:n]:
+        linhas.append({
+            **projecao.jornada(int(i)),
+            'saldo_final': round(float(projecao.saldo_final[i]), 2),
+            'dias_folga': round(float(projecao.dias_folga[i]), 2),
+            'folgas_ganhas': int(projecao.folgas_ganhas[i]),
+        })
+    return pd.DataFrame(linhas)
@@ -0,0 +1,37 @@
+"""
+Retentativa de leituras em falhas transitórias de conexão (Neon serverless).
+
+Módulo à parte para poder decorar leituras de qualquer camada do núcleo
+(`armazenamento`, `auditoria`, `fechamento`) sem import circular.
+"""
+import functools
+import random
+import time
+
+from sqlalchemy import exc
+
+def _erro_transitorio(erro: Exception) -> bool:
+    if isinstance(erro, (exc.OperationalError, exc.InterfaceError, exc.TimeoutError)):
+        return True
+    return isinstance(erro, exc.DBAPIError) and erro.connection_invalidated
+
+def com_retentativa(func=None, *, tentativas: int = 3, espera_inicial: float = 0.2,
+                    fator: float = 2.0, espera_max: float = 2.0):
+    """
+    Repete leituras idempotentes em falhas transitórias de conexão
+    (backoff exponencial com jitter). Nunca use em escritas.
+    """
+    def decorador(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            espera = espera_inicial
+            for tentativa in range(1, tentativas + 1):
+                try:
+                    return f(*args, **kwargs)
+                except Exception as e:
+                    if tentativa == tentativas or not _erro_transitorio(e):
+                        raise
+                    time.sleep(min(espera, espera_max) * (0.5 + random.random() / 2))
+                    espera *= fator
+        return wrapper
+    return decorador(func) if func else decorador
@@ -0,0 +1,147 @@
+import pandas as pd
+from datetime import timedelta
+from typing import Optional
+
+from core.calendario import META_DIARIA, definir_meta
+
+# --- HELPERS DE TEMPO ---
+def parse_db_time_to_delta(time_str: Optional[str]) -> timedelta:
+    if pd.isna(time_str) or str(time_str).strip() in ['None', '']: return timedelta(0)
+    try:
+        parts = list(map(int, str(time_str).split(':')))
+        if len(parts) == 2: return timedelta(hours=parts[0], minutes=parts[1])
+        elif len(parts) == 3: return timedelta(hours=parts[0], minutes=parts[1], seconds=parts[2])
+        return timedelta(0)
+    except ValueError: return timedelta(0)
+
+def calcular_delta_com_virada(inicio_str: Optional[str], fim_str: Optional[str]) -> float:
+    t_ini = parse_db_time_to_delta(inicio_str)
+    t_fim = parse_db_time_to_delta(fim_str)
+    if t_ini == t_fim: return 0.0
+    delta = t_fim - t_ini
+    if delta.total_seconds() < 0: delta += timedelta(days=1)
+    return delta.total_seconds() / 3600.0
+
+# --- PROCESSAMENTO PRINCIPAL ---
+def processar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty: return df
+    df = df.copy()  # não altera o DataFrame de quem chamou
+    df['data_dt'] = pd.to_datetime(df['data'], errors='coerce')
+    
+    # 1. Durações Brutas
+    cols_tempo = ['entrada', 'saida', 'almoco_ida', 'almoco_volta']
+    for col in cols_tempo:
+        df[f'td_{col}'] = df[col].apply(parse_db_time_to_delta)
+
+    # Turno que vira a meia-noite (saída < entrada; saída 00:00 = não bateu ainda)
+    um_dia = pd.Timedelta(days=1)
+    virada = (df['td_saida'] < df['td_entrada']) & (df['td_saida'] > pd.Timedelta(0))
+    jornada_bruta = df['td_saida'] + virada.astype(int) * um_dia - df['td_entrada']
+    pausa_almoco = df['td_almoco_volta'] - df['td_almoco_ida']
+    pausa_almoco = pausa_almoco + (virada & (pausa_almoco < pd.Timedelta(0))).astype(int) * um_dia
+    
+    df['horas_principal'] = (jornada_bruta - pausa_almoco).dt.total_seconds() / 3600.0
+    # Turno em aberto (saída ainda não batida) não conta horas até a saída ser registrada
+    df.loc[df['td_saida'] == pd.Timedelta(0), 'horas_principal'] = 0.0
+    df['horas_principal'] = df['horas_principal'].fillna(0.0)
+    
+    df['horas_extra_campo'] = df.apply(lambda x: calcular_delta_com_virada(x['extra_inicio'], x['extra_fim']), axis=1)
+    df['horas_extra_campo'] = df['horas_extra_campo'].fillna(0.0)
+    
+    # 2. Distribuição Geográfica
+    def distribuir_horas(row):
+        is_ho = row.get('home_office', 0) == 1
+        principal = row['horas_principal']
+        extra = row['horas_extra_campo']
+        if is_ho: return 0.0, principal + extra
+        else: return principal, extra
+
+    df[['horas_escritorio', 'horas_casa']] = df.apply(distribuir_horas, axis=1, result_type='expand')
+    df['total_trabalhado'] = df['horas_escritorio'] + df['horas_casa']
+    
+    # 3. Metas e Motivos (Usando Calendário SP)
+    meta_info = df.apply(lambda r: definir_meta(r), axis=1)
+    df['meta_calculada'] = meta_info.apply(lambda x: x[0])
+    df['motivo_dia'] = meta_info.apply(lambda x: x[1])
+
+    # 4. Cálculo de Extras com MULTIPLICADOR TRIFÁSICO
+    def calcular_extras_com_peso(row):
+        saldo_bruto = row['total_trabalhado'] - row['meta_calculada']
+        motivo = str(row['motivo_dia']).lower()
+        
+        if saldo_bruto <= 0:
+            return 0.0, 0.0, saldo_bruto 
+            
+        # Regra de Pesos (CLT + Convenção)
+        if "domingo" in motivo or "feriado" in motivo:
+            peso = 2.0 # 100%
+        elif "sábado" in motivo:
+            peso = 1.5 # 50%
+        else:
+            peso = 1.0 # Dia Útil
+        
+        saldo_com_peso = saldo_bruto * peso
+        
+        meta = row['meta_calculada']
+        h_esc = row['horas_escritorio']
+        
+        if h_esc > meta:
+            extra_esc = (h_esc - meta) * peso
+            extra_casa = row['horas_casa'] * peso
+        else:
+            extra_esc = 0.0
+            extra_casa = saldo_com_peso
+            
+        return extra_esc, extra_casa, saldo_com_peso
+
+    df[['extra_escritorio', 'extra_casa', 'saldo']] = df.apply(calcular_extras_com_peso, axis=1, result_type='expand')
+
+    cols_float = ['horas_escritorio', 'horas_casa', 'total_trabalhado', 
+                  'horas_principal', 'horas_extra_campo', 'extra_escritorio', 'extra_casa', 'saldo']
+    df[cols_float] = df[cols_float].round(2)
+    
+    return df
+
+# --- BALANÇO CONSOLIDADO (KPIs) ---
+# Campos que podem ser somados entre períodos (checkpoints + dias em aberto)
+CAMPOS_ADITIVOS = ['saldo', 'extra_casa', 'extra_escritorio', 'total_debitos', 'plantoes',
+                   'total_trabalhado', 'dias_registrados', 'dias_trabalhados', 'horas_dias_trabalhados']
+
+def _derivar_kpis(base: dict) -> dict:
+    """Completa os KPIs derivados (folga, créditos, média) a partir dos campos aditivos."""
+    b = {k: base.get(k, 0) for k in CAMPOS_ADITIVOS}
+    for k in CAMPOS_ADITIVOS:
+        b[k] = int(b[k]) if k.startswith('dias_') else round(float(b[k]), 2)
+    b['dias_folga'] = round(b['saldo'] / META_DIARIA, 2)
+    b['total_creditos'] = round(b['extra_casa'] + b['extra_escritorio'], 2)
+    b['media_dia'] = round(b['horas_dias_trabalhados'] / b['dias_trabalhados'], 2) if b['dias_trabalhados'] else 0.0
+    return b
+
+def resumir_balanco(df: pd.DataFrame) -> dict:
+    """
+    Consolida os KPIs do extrato a partir de um DataFrame já processado.
+    Usado pela aba de Lançamento e pelo fechamento mensal em lote.
+    """
+    if df.empty:
+        return _derivar_kpis({})
+
+    # Saldo simples (sem peso), igual ao exibido no painel
+    saldo = df['total_trabalhado'] - df['meta_calculada']
+    trabalhados = df.loc[df['total_trabalhado'] > 0, 'total_trabalhado']
+
+    return _derivar_kpis({
+        'saldo': saldo.sum(),
+        'extra_casa': df['extra_casa'].sum(),
+        'extra_escritorio': df['extra_escritorio'].sum(),
+        'total_debitos': saldo[saldo < 0].sum(),
+        'plantoes': df.loc[df['meta_calculada'] == 0, 'total_trabalhado'].sum(),
+        'total_trabalhado': df['total_trabalhado'].sum(),
+        'dias_registrados': len(df),
+        'dias_trabalhados': len(trabalhados),
+        'horas_dias_trabalhados': trabalhados.sum(),
+    })
+
+def somar_balancos(*balancos: dict) -> dict:
+    """Soma balanços de períodos disjuntos (ex.: checkpoints fechados + dias em aberto)."""
+    total = {k: sum(b.get(k, 0) or 0 for b in balancos) for k in CAMPOS_ADITIVOS}
+    return _derivar_kpis(total)
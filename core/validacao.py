@@ -0,0 +1,148 @@
+"""
+Validação de integridade das batidas.
+
+`validar_lote` roda vetorizado sobre um DataFrame inteiro (importações,
+migrações, histórico) e devolve uma tabela de erros/avisos por linha.
+`validar_registro` é o caso de uma linha só, usado pelo formulário.
+
+Turnos que viram a meia-noite (ex.: entra 22h, sai 05h) são aceitos e
+sinalizados com aviso, na mesma linha de `calcular_delta_com_virada`.
+"""
+import numpy as np
+import pandas as pd
+
+COLUNAS_BATIDA = ['entrada', 'almoco_ida', 'almoco_volta', 'saida']
+COLUNAS_RELATORIO = ['linha', 'data', 'severidade', 'regra', 'mensagem']
+
+MINUTOS_DIA = 24 * 60
+ALMOCO_MINIMO_MIN = 60          # CLT: 1 hora
+JORNADA_LONGA_MIN = 16 * 60     # acima disso quase sempre é erro de digitação
+
+# regra -> (severidade, mensagem). A ordem define a prioridade no formulário.
+REGRAS = {
+    'formato': ('erro', "❌ Horário inválido (use HH:MM)."),
+    'saida_igual_entrada': ('erro', "❌ A Saída não pode ser igual à Entrada!"),
+    'almoco_fora_jornada': ('erro', "❌ O horário de almoço deve estar entre a Entrada e a Saída."),
+    'almoco_ordem': ('erro', "❌ A volta do almoço deve ser depois da ida."),
+    'almoco_curto': ('aviso', "⚠️ Almoço menor que 1h (CLT)."),
+    'virada_meia_noite': ('aviso', "🌙 Turno atravessa a meia-noite."),
+    'jornada_longa': ('aviso', "⚠️ Jornada acima de 16h."),
+    'saida_em_aberto': ('aviso', "⏳ Saída ainda não registrada: o dia conta 0h até lá."),
+}
+
+# --- PARSE VETORIZADO ---
+def horarios_em_minutos(serie: pd.Series) -> np.ndarray:
+    """
+    Converte 'HH:MM' / 'HH:MM:SS' (ou H:MM) em minutos desde 00:00, sem laço Python.
+    Vazios, 'None' e textos inválidos viram NaN.
+    """
+    texto = serie.astype(str).str.strip()
+    # O parse abaixo lê 8 caracteres fixos: o que passa disso seria truncado em silêncio
+    longo_demais = (texto.str.len() > 8).to_numpy()
+    texto = texto.to_numpy(dtype='U8')
+    # Cada caractere vira um código UCS-4: matriz (n, 8) de inteiros
+    cod = np.frombuffer(texto.tobytes(), dtype=np.uint32).reshape(len(texto), 8).astype(np.int64)
+    dig = cod - ord('0')
+    e_dig = (dig >= 0) & (dig <= 9)
+    dois_pontos = cod == ord(':')
+
+    # Formato HH:MM[...]
+    longo = e_dig[:, 0] & e_dig[:, 1] & dois_pontos[:, 2] & e_dig[:, 3] & e_dig[:, 4]
+    # Formato H:MM[...]
+    curto = e_dig[:, 0] & dois_pontos[:, 1] & e_dig[:, 2] & e_dig[:, 3]
+
+    horas = np.where(longo, dig[:, 0] * 10 + dig[:, 1], dig[:, 0])
+    minutos = np.where(longo, dig[:, 3] * 10 + dig[:, 4], dig[:, 2] * 10 + dig[:, 3])
+
+    # Depois de HH:MM só pode vir nada ou ':SS'
+    resto_longo = (cod[:, 5] == 0) | (dois_pontos[:, 5] & e_dig[:, 6] & e_dig[:, 7])
+    resto_curto = (cod[:, 4] == 0) | (dois_pontos[:, 4] & e_dig[:, 5] & e_dig[:, 6] & (cod[:, 7] == 0))
+    valido = ((longo & resto_longo) | (curto & ~longo & resto_curto)) & (horas < 24) & (minutos < 60) & ~longo_demais
+
+    return np.where(valido, horas * 60 + minutos, np.nan).astype(float)
+
+# --- MOTOR EM LOTE ---
+def validar_lote(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Valida todas as linhas de uma vez.
+    Retorna um DataFrame (linha, data, severidade, regra, mensagem), uma entrada
+    por violação; vazio se estiver tudo certo. `linha` é o rótulo do índice original.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUNAS_RELATORIO)
+
+    ent, ai, av, sai = (horarios_em_minutos(df[c]) for c in COLUNAS_BATIDA)
+
+    # Falta: tudo zerado é válido por definição
+    falta = (ent == 0) & (ai == 0) & (av == 0) & (sai == 0)
+    formato = ~falta & (np.isnan(ent) | np.isnan(ai) | np.isnan(av) | np.isnan(sai))
+    ok = ~falta & ~formato
+
+    # Saída 00:00 = "ainda não bateu"
+    em_aberto = ok & (sai == 0) & (ent != 0)
+    fechado = ok & ~em_aberto
+
+    # Desenrola a linha do tempo só quando o turno vira a noite
+    virada = fechado & (sai < ent)
+    sai_l = np.where(virada, sai + MINUTOS_DIA, sai)
+    ai_l = np.where(virada & (ai < ent), ai + MINUTOS_DIA, ai)
+    av_l = np.where(virada & (av < ai_l), av + MINUTOS_DIA, av)
+
+    jornada = sai_l - ent
+    almoco = av_l - ai_l
+    igual = fechado & (sai == ent)
+
+    violacoes = {
+        'formato': formato,
+        'saida_igual_entrada': igual,
+        'almoco_fora_jornada': ok & ~igual & ((ai_l < ent) | (fechado & (av_l > sai_l))),
+        'almoco_ordem': ok & (almoco <= 0),
+        'almoco_curto': ok & (almoco > 0) & (almoco < ALMOCO_MINIMO_MIN),
+        'virada_meia_noite': virada,
+        'jornada_longa': fechado & (jornada > JORNADA_LONGA_MIN),
+        'saida_em_aberto': em_aberto,
+    }
+
+    datas = df['data'].astype(str).to_numpy() if 'data' in df.columns else np.full(len(df), None)
+    rotulos = df.index.to_numpy()
+    partes = []
+    for regra, mascara in violacoes.items():
+        idx = np.flatnonzero(mascara)
+        if not len(idx): continue
+        severidade, mensagem = REGRAS[regra]
+        partes.append(pd.DataFrame({
+            'linha': rotulos[idx], 'data': datas[idx],
+            'severidade': severidade, 'regra': regra, 'mensagem': mensagem,
+        }))
+
+    if not partes:
+        return pd.DataFrame(columns=COLUNAS_RELATORIO)
+    return pd.concat(partes, ignore_index=True).sort_values('linha', kind='stable').reset_index(drop=True)
+
+# --- VALIDAÇÃO DE INTEGRIDADE (FORMULÁRIO) ---
+def validar_registro(entrada, almoco_ida, almoco_volta, saida, is_falta):
+    """
+    Verifica se os horários fazem sentido lógico.
+    Retorna: (bool, str) -> (Passou?, Mensagem de Erro ou Aviso)
+    """
+    # 1. Se for falta, tudo bem estar zerado
+    if is_falta:
+        return True, ""
+
+    # 2. Mesmas regras do lote, numa linha só
+    linha = pd.DataFrame([{
+        'entrada': str(entrada), 'almoco_ida': str(almoco_ida),
+        'almoco_volta': str(almoco_volta), 'saida': str(saida)
+    }])
+    relatorio = validar_lote(linha)
+    if relatorio.empty:
+        return True, ""
+
+    prioridade = list(REGRAS)
+    relatorio = relatorio.assign(ordem=relatorio['regra'].map(prioridade.index)).sort_values('ordem')
+    erros = relatorio[relatorio['severidade'] == 'erro']
+    if not erros.empty:
+        return False, erros.iloc[0]['mensagem']
+
+    # Avisos não bloqueiam o salvamento
+    return True, " ".join(relatorio['mensagem'])
@@ -1,116 +1,122 @@
+"""
+Adaptador Streamlit da camada de dados.
+
+A conexão vem do `st.connection` (segredos do Streamlit); o SQL em si está em
+`core/armazenamento.py`, que também é usado pelos CLIs fora do Streamlit.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict
+
 import streamlit as st
-from sqlalchemy import text
+
+from core import armazenamento as arm
+from core import analitico as an
+from core import auditoria as aud
+from core import consultas as cns
+from core import fechamento as fch
+from core.livro import RepositorioLivros
+
+PeriodoFechadoError = arm.PeriodoFechadoError
+ConflitoVersaoError = arm.ConflitoVersaoError
 
 # --- CAMADA DE DADOS (POSTGRESQL / NEON) ---
+def _dialeto_configurado(config) -> str:
+    """'dialeto[+driver]' dos secrets: da `url` ou dos campos `dialect`/`driver` do st.connection."""
+    if config.get("url"):
+        return arm.dialeto_da_url(config["url"])
+    dialeto, driver = config.get("dialect", "postgresql"), config.get("driver")
+    return f"{dialeto}+{driver}" if driver else dialeto
+
 @st.cache_resource
 def get_db_connection():
-    return st.connection("postgresql", type="sql")
-
-def init_db():
-    """Inicializa tabelas (Dados + Auditoria) e roda migrações."""
-    conn = get_db_connection()
-    with conn.session as s:
-        # 1. Tabela Principal
-        s.execute(text('''
-            CREATE TABLE IF NOT EXISTS registros (
-                data TEXT PRIMARY KEY,
-                entrada TEXT,
-                almoco_ida TEXT,
-                almoco_volta TEXT,
-                saida TEXT,
-                extra_inicio TEXT, 
-                extra_fim TEXT,
-                obs TEXT,
-                feriado_manual INTEGER DEFAULT 0,
-                home_office INTEGER DEFAULT 0
-            );
-        '''))
-        
-        # 2. Tabela de Auditoria (NOVA)
-        s.execute(text('''
-            CREATE TABLE IF NOT EXISTS audit_logs (
-                id SERIAL PRIMARY KEY,
-                data_evento TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                acao TEXT,          -- 'SALVAR', 'EXCLUIR'
-                data_registro TEXT, -- Qual dia foi afetado
-                detalhes TEXT       -- Msg descritiva
-            );
-        '''))
-        
-        s.commit()
-        
-        # Migrações silenciosas
-        colunas_novas = [
-            "ALTER TABLE registros ADD COLUMN extra_inicio TEXT;",
-            "ALTER TABLE registros ADD COLUMN extra_fim TEXT;",
-            "ALTER TABLE registros ADD COLUMN home_office INTEGER DEFAULT 0;"
-        ]
-        for sql in colunas_novas:
-            try:
-                s.execute(text(sql))
-                s.commit()
-            except:
-                s.rollback()
-
-def salvar_registro(data, entrada, a_ida, a_volta, saida, ext_ini, ext_fim, obs, is_feriado, is_home_office):
-    conn = get_db_connection()
-    feriado_int = 1 if is_feriado else 0
-    home_office_int = 1 if is_home_office else 0
-    
-    # Lógica de Upsert
-    sql = text('''
-        INSERT INTO registros (data, entrada, almoco_ida, almoco_volta, saida, extra_inicio, extra_fim, obs, feriado_manual, home_office)
-        VALUES (:data, :ent, :ai, :av, :sai, :ei, :ef, :obs, :fer, :ho)
-        ON CONFLICT (data) DO UPDATE SET
-            entrada = EXCLUDED.entrada,
-            almoco_ida = EXCLUDED.almoco_ida,
-            almoco_volta = EXCLUDED.almoco_volta,
-            saida = EXCLUDED.saida,
-            extra_inicio = EXCLUDED.extra_inicio,
-            extra_fim = EXCLUDED.extra_fim,
-            obs = EXCLUDED.obs,
-            feriado_manual = EXCLUDED.feriado_manual,
-            home_office = EXCLUDED.home_office;
-    ''')
-    
-    params = {
-        "data": data, "ent": str(entrada), "ai": str(a_ida), "av": str(a_volta), "sai": str(saida),
-        "ei": str(ext_ini), "ef": str(ext_fim), "obs": obs, "fer": feriado_int, "ho": home_office_int
-    }
-    
-    with conn.session as s:
-        s.execute(sql, params)
-        
-        # [AUDITORIA] Grava o rastro
-        s.execute(text('''
-            INSERT INTO audit_logs (acao, data_registro, detalhes)
-            VALUES ('SALVAR', :d, 'Usuário criou ou atualizou este registro.')
-        '''), {'d': data})
-        
-        s.commit()
-    
+    # Pool dimensionado para o Neon (pre-ping, reciclagem, keepalive TCP).
+    # [connections.postgresql.create_engine_kwargs] nos secrets tem a palavra final.
+    config = st.secrets.get("connections", {}).get("postgresql", {})
+    do_secrets = config.get("create_engine_kwargs", {})
+    return st.connection("postgresql", type="sql",
+                         **arm.opcoes_pool(_dialeto_configurado(config), **dict(do_secrets)))
+
+def get_engine():
+    return get_db_connection().engine
+
+@st.cache_resource
+def aquecer_conexao():
+    """Acorda o banco em segundo plano uma única vez por processo (cold start do Neon)."""
+    return arm.aquecer_em_segundo_plano(get_engine())
+
+# --- CONSULTAS CONCORRENTES ---
+# Pool do processo (compartilhado pelas sessões). As threads só chamam o
+# núcleo (`core`): engine e repositório são resolvidos antes, na thread do
+# script, porque st.connection/st.cache_* dependem do contexto do Streamlit.
+@st.cache_resource
+def pool_consultas():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="consulta-bd")
+
+@st.cache_resource
+def _inicializacao() -> Future:
+    return pool_consultas().submit(arm.init_db, get_engine())
+
+def banco_inicializado() -> Future:
+    """init_db uma vez por processo, em segundo plano. Se falhou, a próxima chamada tenta de novo."""
+    futuro = _inicializacao()
+    if futuro.done() and futuro.exception() is not None:
+        _inicializacao.clear()
+        futuro = _inicializacao()
+    return futuro
+
+def consultas_do_rerun() -> Dict[str, Future]:
+    """Versão, livro, logs e meses do rerun, em paralelo (ver `core.consultas.disparar`)."""
+    return cns.disparar(pool_consultas(), get_engine(), repositorio_livros(), banco_inicializado())
+
+def salvar_registro(data, entrada, a_ida, a_volta, saida, ext_ini, ext_fim, obs, is_feriado, is_home_office,
+                    versao_esperada=None):
+    nova_versao = arm.salvar_registro(get_engine(), data, entrada, a_ida, a_volta, saida, ext_ini, ext_fim,
+                                      obs, is_feriado, is_home_office, versao_esperada)
     st.cache_data.clear()
+    return nova_versao
 
-def excluir_registro(data_str):
-    conn = get_db_connection()
-    with conn.session as s:
-        s.execute(text("DELETE FROM registros WHERE data = :d"), {"d": data_str})
-        
-        # [AUDITORIA] Grava o rastro da exclusão
-        s.execute(text('''
-            INSERT INTO audit_logs (acao, data_registro, detalhes)
-            VALUES ('EXCLUIR', :d, 'Registro apagado permanentemente.')
-        '''), {'d': data_str})
-        
-        s.commit()
+def excluir_registro(data_str, versao_esperada=None):
+    nova_versao = arm.excluir_registro(get_engine(), data_str, versao_esperada)
     st.cache_data.clear()
+    return nova_versao
+
+# --- LIVRO COMPARTILHADO (UM POR VERSÃO, PARA TODAS AS SESSÕES) ---
+# cache_resource e não cache_data: o cache_data devolve uma cópia (pickle) a
+# cada chamada, ou seja, um DataFrame inteiro por sessão. O livro é imutável
+# e a mesma instância atende todo mundo.
+@st.cache_resource
+def repositorio_livros():
+    return RepositorioLivros(max_versoes=4)
+
+def publicar_gravacao(livro_atual, linha, nova_versao):
+    """Após salvar: deriva o livro da nova versão sem reler o banco, se ninguém escreveu no meio."""
+    if livro_atual.versao is not None and nova_versao == livro_atual.versao + 1:
+        repositorio_livros().publicar(livro_atual.com_gravacao(linha, nova_versao))
 
-def carregar_dados():
-    conn = get_db_connection()
-    return conn.query("SELECT * FROM registros", ttl=0)
+def publicar_exclusao(livro_atual, data, nova_versao):
+    if livro_atual.versao is not None and nova_versao == livro_atual.versao + 1:
+        repositorio_livros().publicar(livro_atual.com_exclusao(data, nova_versao))
+
+def registros_em(instante):
+    """Estado de `registros` num instante passado (snapshot + replay dos diffs)."""
+    return aud.registros_em(get_engine(), instante)
+
+# --- FECHAMENTO DE PERÍODOS ---
+def fechar_ate(mes):
+    nova_versao = fch.fechar_ate(get_engine(), mes)
+    st.cache_data.clear()
+    return nova_versao
+
+def reabrir_a_partir(mes):
+    nova_versao = fch.reabrir_a_partir(get_engine(), mes)
+    st.cache_data.clear()
+    return nova_versao
 
-# Nova função para ler a auditoria
-def buscar_logs():
-    conn = get_db_connection()
-    # Pega os últimos 100 eventos (do mais recente pro mais antigo)
-    return conn.query("SELECT * FROM audit_logs ORDER BY id DESC LIMIT 100", ttl=0)
\ No newline at end of file
+# --- ANALYTICS (AGREGADO NO BANCO) ---
+@st.cache_data(show_spinner=False, max_entries=32)
+def agregados_analiticos(versao, inicio, fim, apenas_fds):
+    """Heatmap/semana/chegada/proporção calculados em SQL; None se o banco não suporta (ex.: SQLite)."""
+    engine = get_engine()
+    if not an.suporta_sql(engine):
+        return None
+    return an.consultar_agregados(engine, inicio, fim, apenas_fds)
@@ -0,0 +1,213 @@
+"""
+Teste de estresse da concorrência otimista (coluna `registros.versao`).
+
+Três cenários, cada um com N threads escrevendo ao mesmo tempo:
+
+  contador   todas as threads fazem ler-modificar-gravar no MESMO dia,
+             incrementando um contador guardado em `obs`. Em conflito, relêem
+             e tentam de novo. Ao final o contador tem de ser exatamente
+             threads × incrementos (nenhuma atualização perdida).
+  disjuntos  cada thread grava os SEUS dias. Nenhum conflito pode ocorrer e,
+             no Postgres, as escritas têm de se sobrepor: com a transação de
+             um dia ainda aberta, a gravação de outro dia termina antes dela.
+  recriado   cada thread lê o seu dia e, antes de gravar, outra sessão o apaga
+             e o recria. A gravação e a exclusão com a leitura velha têm de
+             ser recusadas: a versão da linha recriada nunca repete a antiga.
+
+Com --sem-versao o cenário `contador` usa a escrita cega antiga, para
+mostrar as atualizações perdidas que a versão evita.
+
+Uso:
+    python estresse_concorrencia.py                               # SQLite temporário
+    python estresse_concorrencia.py --db-url postgresql://... --threads 16 --incrementos 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from core import armazenamento as arm
+
+DIA_CONTADOR = '2000-01-03'  # dia fora do uso real, reescrito a cada execução
+
+def _gravar(engine, data, obs, versao_esperada):
+    return arm.salvar_registro(engine, data, '09:00:00', '12:00:00', '13:00:00', '18:00:00',
+                               '00:00:00', '00:00:00', obs, False, False, versao_esperada)
+
+def _ler(engine, data):
+    with engine.connect() as conn:
+        return arm.ler_registro(conn, data)
+
+# --- CENÁRIOS ---
+def cenario_contador(engine, threads: int, incrementos: int, com_versao: bool = True) -> dict:
+    with engine.begin() as conn:
+        conn.execute(arm.SQL_EXCLUIR_REGISTRO, {'d': DIA_CONTADOR})
+    _gravar(engine, DIA_CONTADOR, '0', None)
+
+    conflitos = [0] * threads
+    barreira = threading.Barrier(threads)
+
+    def trabalhador(i):
+        barreira.wait()
+        for _ in range(incrementos):
+            while True:
+                linha = _ler(engine, DIA_CONTADOR)
+                try:
+                    _gravar(engine, DIA_CONTADOR, str(int(linha['obs']) + 1),
+                            int(linha['versao']) if com_versao else None)
+                    break
+                except arm.ConflitoVersaoError:
+                    conflitos[i] += 1
+
+    inicio = time.perf_counter()
+    _rodar(trabalhador, threads)
+    duracao = time.perf_counter() - inicio
+
+    final = _ler(engine, DIA_CONTADOR)
+    esperado = threads * incrementos
+    # A última escrita do banco foi neste dia: a linha tem de estar na versão dos dados
+    versao_ok = int(final['versao']) == arm.versao_dados(engine)
+    return {
+        'esperado': esperado, 'obtido': int(final['obs']), 'versao_linha': int(final['versao']),
+        'conflitos': sum(conflitos), 'duracao_s': duracao,
+        'ok': int(final['obs']) == esperado and (not com_versao or versao_ok),
+    }
+
+def cenario_disjuntos(engine, threads: int, dias_por_thread: int) -> dict:
+    base = date(2000, 2, 1)
+    dias = [[(base + timedelta(days=i * dias_por_thread + j)).isoformat() for j in range(dias_por_thread)]
+            for i in range(threads)]
+    with engine.begin() as conn:
+        for lista in dias:
+            for d in lista:
+                conn.execute(arm.SQL_EXCLUIR_REGISTRO, {'d': d})
+
+    conflitos = [0] * threads
+    barreira = threading.Barrier(threads)
+
+    def trabalhador(i):
+        barreira.wait()
+        for d in dias[i]:
+            versao = 0
+            for _ in range(2):  # cria e depois edita o próprio dia
+                try:
+                    versao = _gravar(engine, d, f"thread {i}", versao)
+                except arm.ConflitoVersaoError:
+                    conflitos[i] += 1
+
+    inicio = time.perf_counter()
+    _rodar(trabalhador, threads)
+    duracao = time.perf_counter() - inicio
+
+    # SQLite tem um único escritor por vez: a sobreposição só é exigida no Postgres
+    sobreposta = None if engine.dialect.name == 'sqlite' else _escrita_sobreposta(engine, dias[0][0], dias[-1][-1])
+
+    escritas = threads * dias_por_thread * 2
+    return {'escritas': escritas, 'conflitos': sum(conflitos), 'duracao_s': duracao,
+            'escritas_por_s': escritas / duracao, 'sobreposta': sobreposta,
+            'ok': sum(conflitos) == 0 and sobreposta is not False}
+
+def _escrita_sobreposta(engine, dia_aberto, dia_outro, espera: float = 10.0) -> bool:
+    """Com a transação de `dia_aberto` aberta (linha já escrita), `dia_outro` é gravado antes dela terminar?"""
+    gravou = threading.Event()
+    def outra_sessao():
+        _gravar(engine, dia_outro, "sobreposta", None)
+        gravou.set()
+
+    outra = threading.Thread(target=outra_sessao)
+    with engine.connect() as conn, conn.begin():
+        conn.execute(arm.SQL_UPSERT_REGISTRO, {
+            'data': dia_aberto, 'ent': '09:00:00', 'ai': '12:00:00', 'av': '13:00:00', 'sai': '18:00:00',
+            'ei': '00:00:00', 'ef': '00:00:00', 'obs': "aberta", 'fer': 0, 'ho': 0})
+        outra.start()
+        sobreposta = gravou.wait(espera)
+        arm.avancar_versao(conn, [dia_aberto])
+    outra.join()
+    return sobreposta
+
+def cenario_recriado(engine, threads: int) -> dict:
+    base = date(2000, 3, 1)
+    dias = [(base + timedelta(days=i)).isoformat() for i in range(threads)]
+    with engine.begin() as conn:
+        for d in dias:
+            conn.execute(arm.SQL_EXCLUIR_REGISTRO, {'d': d})
+
+    aceitas = [0] * threads  # escritas com leitura velha que passaram (atualização perdida)
+    barreira = threading.Barrier(threads)
+
+    def trabalhador(i):
+        d = dias[i]
+        barreira.wait()
+        _gravar(engine, d, "original", 0)
+        lida = int(_ler(engine, d)['versao'])
+        # Outra sessão apaga e recria o dia com o mesmo conteúdo
+        arm.excluir_registro(engine, d, lida)
+        _gravar(engine, d, "original", 0)
+        for escrita in (lambda: _gravar(engine, d, f"thread {i}", lida),
+                        lambda: arm.excluir_registro(engine, d, lida)):
+            try:
+                escrita()
+                aceitas[i] += 1
+            except arm.ConflitoVersaoError:
+                pass
+
+    inicio = time.perf_counter()
+    _rodar(trabalhador, threads)
+    duracao = time.perf_counter() - inicio
+
+    intactos = sum(_ler(engine, d)['obs'] == "original" for d in dias)
+    return {'tentativas': threads * 2, 'aceitas': sum(aceitas), 'intactos': intactos, 'duracao_s': duracao,
+            'ok': sum(aceitas) == 0 and intactos == threads}
+
+def _rodar(alvo, threads: int):
+    erros = []
+    def protegido(i):
+        try:
+            alvo(i)
+        except Exception as e:
+            erros.append(e)
+    ts = [threading.Thread(target=protegido, args=(i,)) for i in range(threads)]
+    for t in ts: t.start()
+    for t in ts: t.join()
+    if erros:
+        raise erros[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Estresse de escritores concorrentes (concorrência otimista).")
+    parser.add_argument('--db-url', default=os.environ.get('DATABASE_URL'),
+                        help="URL SQLAlchemy do banco (padrão: $DATABASE_URL ou SQLite temporário).")
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--incrementos', type=int, default=25, help="Incrementos por thread no cenário contador.")
+    parser.add_argument('--dias', type=int, default=25, help="Dias por thread no cenário disjuntos.")
+    parser.add_argument('--sem-versao', action='store_true', help="Contador com escrita cega (mostra o problema).")
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'estresse.db')}"
+    if db_url.startswith('sqlite'):
+        # SQLite serializa escritores: espera o lock em vez de falhar com "database is locked"
+        engine = arm.criar_engine(db_url, connect_args={'timeout': 60})
+    else:
+        engine = arm.criar_engine(db_url, pool_size=args.threads)  # uma conexão por thread
+    arm.init_db(engine)
+
+    c = cenario_contador(engine, args.threads, args.incrementos, com_versao=not args.sem_versao)
+    print(f"{'✅' if c['ok'] else '❌'} contador: {c['obtido']}/{c['esperado']} incrementos "
+          f"(versão da linha {c['versao_linha']}), {c['conflitos']} conflitos refeitos, {c['duracao_s']:.2f}s")
+
+    d = cenario_disjuntos(engine, args.threads, args.dias)
+    sobreposicao = {None: "n/a no SQLite", True: "sim", False: "NÃO (escritores serializados)"}[d['sobreposta']]
+    print(f"{'✅' if d['ok'] else '❌'} disjuntos: {d['escritas']} escritas, {d['conflitos']} conflitos, "
+          f"{d['escritas_por_s']:,.0f} escritas/s, sobreposição: {sobreposicao}")
+
+    r = cenario_recriado(engine, args.threads)
+    print(f"{'✅' if r['ok'] else '❌'} recriado: {r['aceitas']}/{r['tentativas']} escritas com leitura velha aceitas, "
+          f"{r['intactos']}/{args.threads} dias intactos, {r['duracao_s']:.2f}s")
+    print(f"   banco: {db_url}")
+
+    sys.exit(0 if c['ok'] and d['ok'] and r['ok'] else 1)
+
+if __name__ == '__main__':
+    main()
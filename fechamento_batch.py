@@ -0,0 +1,216 @@
+"""
+Fechamento mensal em lote (fora do Streamlit).
+
+Particiona os registros por funcionário e mês, calcula o balanço de cada
+partição em um pool de processos (mesma regra do núcleo `core`) e grava o resultado
+na tabela `fechamentos_mensais` e em um Excel por funcionário.
+
+Meses fechados no app (`checkpoints_mensais`) estão congelados: não são
+recalculados, e o extrato deles sai dos totais do checkpoint, então as duas
+tabelas nunca divergem. O checkpoint vale para a tabela `registros` inteira;
+com a coluna de funcionário, os meses fechados ficam como já estavam gravados.
+
+Uso:
+    python fechamento_batch.py --db-url postgresql://... --saida fechamentos/
+    python fechamento_batch.py --db-url sqlite:///banco_horas_flex_v2.db --workers 4
+"""
+import argparse
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+
+from core import armazenamento as arm
+from core import fechamento as fch
+from core.saldo import processar_dataframe, resumir_balanco, somar_balancos
+
+# Quando a tabela não tem coluna de funcionário, tudo cai numa partição só
+COLUNA_FUNCIONARIO = 'funcionario'
+FUNCIONARIO_PADRAO = 'padrao'
+
+# --- PARTICIONAMENTO ---
+def particionar(df: pd.DataFrame, funcionario_padrao: str = FUNCIONARIO_PADRAO) -> List[Tuple[str, str, pd.DataFrame]]:
+    """Quebra o DataFrame bruto em partições (funcionario, 'AAAA-MM', registros)."""
+    if df.empty: return []
+    df = df.copy()
+    if COLUNA_FUNCIONARIO not in df.columns:
+        df[COLUNA_FUNCIONARIO] = funcionario_padrao
+    df['mes'] = df['data'].astype(str).str[:7]
+
+    particoes = []
+    for (funcionario, mes), grupo in df.groupby([COLUNA_FUNCIONARIO, 'mes'], sort=True):
+        particoes.append((str(funcionario), mes, grupo.drop(columns=['mes']).reset_index(drop=True)))
+    return particoes
+
+def resumo_dos_checkpoints(checkpoints: pd.DataFrame, funcionario: str) -> List[dict]:
+    """Linhas de extrato dos meses fechados, com os mesmos KPIs de `resumir_balanco`."""
+    return [{'funcionario': funcionario, 'mes': c['mes'], **somar_balancos(c)} for c in checkpoints.to_dict('records')]
+
+# --- TRABALHO DE CADA PROCESSO ---
+def nome_arquivo_seguro(funcionario: str) -> str:
+    """Nome do funcionário utilizável como arquivo: sem separadores de pasta nem '..' (não escapa de --saida)."""
+    nome = re.sub(r'[^\w.-]+', '_', str(funcionario)).strip('._')
+    return nome or FUNCIONARIO_PADRAO
+
+def nomes_de_arquivo(funcionarios) -> dict:
+    """
+    {funcionario: nome de arquivo}, sem colisões: nomes que ficariam iguais depois
+    de sanitizados (ex.: 'João Silva' e 'João/Silva'), inclusive só na caixa, ganham
+    um hash curto do nome original. Os Excels são gravados em paralelo: uma colisão
+    seria um relatório sobrescrevendo o outro em silêncio.
+    """
+    seguros = {f: nome_arquivo_seguro(f) for f in funcionarios}
+    por_nome = {}
+    for f, nome in seguros.items():
+        por_nome.setdefault(nome.lower(), []).append(f)
+    for f, nome in seguros.items():
+        if len(por_nome[nome.lower()]) > 1:
+            seguros[f] = f"{nome}_{hashlib.blake2b(str(f).encode(), digest_size=4).hexdigest()}"
+    if len({n.lower() for n in seguros.values()}) < len(seguros):
+        raise ValueError("Nomes de funcionário geram arquivos Excel repetidos.")
+    return seguros
+
+def fechar_particao(particao: Tuple[str, str, pd.DataFrame]) -> Tuple[str, str, dict, pd.DataFrame]:
+    funcionario, mes, df_mes = particao
+    df_proc = processar_dataframe(df_mes)
+    resumo = resumir_balanco(df_proc)
+    return funcionario, mes, resumo, df_proc
+
+def gerar_excel_funcionario(args: Tuple[str, str, pd.DataFrame, pd.DataFrame]) -> str:
+    """Escreve um arquivo por funcionário: aba 'Resumo' (meses) + aba 'Ponto' (dias)."""
+    nome_arquivo, pasta, df_resumo, df_dias = args
+    caminho = os.path.join(pasta, f"fechamento_{nome_arquivo}.xlsx")
+    with pd.ExcelWriter(caminho, engine='xlsxwriter') as writer:
+        df_resumo.to_excel(writer, index=False, sheet_name='Resumo')
+        df_dias.to_excel(writer, index=False, sheet_name='Ponto')
+        writer.sheets['Resumo'].set_column('A:B', 12)
+        writer.sheets['Ponto'].set_column('A:A', 12)
+    return caminho
+
+# --- PERSISTÊNCIA ---
+def gravar_fechamentos(engine, df_resumo: pd.DataFrame):
+    with engine.begin() as conn:
+        conn.execute(text('''
+            CREATE TABLE IF NOT EXISTS fechamentos_mensais (
+                funcionario TEXT,
+                mes TEXT,
+                saldo REAL,
+                extra_casa REAL,
+                extra_escritorio REAL,
+                plantoes REAL,
+                total_trabalhado REAL,
+                dias_registrados INTEGER,
+                gerado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (funcionario, mes)
+            );
+        '''))
+        # executemany: um único round-trip lógico para todas as partições
+        conn.execute(text('''
+            INSERT INTO fechamentos_mensais (funcionario, mes, saldo, extra_casa, extra_escritorio,
+                                             plantoes, total_trabalhado, dias_registrados, gerado_em)
+            VALUES (:funcionario, :mes, :saldo, :extra_casa, :extra_escritorio,
+                    :plantoes, :total_trabalhado, :dias_registrados, CURRENT_TIMESTAMP)
+            ON CONFLICT (funcionario, mes) DO UPDATE SET
+                saldo = EXCLUDED.saldo,
+                extra_casa = EXCLUDED.extra_casa,
+                extra_escritorio = EXCLUDED.extra_escritorio,
+                plantoes = EXCLUDED.plantoes,
+                total_trabalhado = EXCLUDED.total_trabalhado,
+                dias_registrados = EXCLUDED.dias_registrados,
+                gerado_em = EXCLUDED.gerado_em;
+        '''), df_resumo.to_dict('records'))
+
+# --- ORQUESTRAÇÃO ---
+def executar_fechamento(df: pd.DataFrame, workers: int = None, funcionario_padrao: str = FUNCIONARIO_PADRAO,
+                        checkpoints: pd.DataFrame = None):
+    """
+    Calcula em paralelo o fechamento das partições em aberto; meses com checkpoint
+    ativo (`checkpoints`) entram com os totais congelados, sem recálculo.
+    Retorna (df_resumo, {funcionario: df_dias_processados dos meses em aberto}).
+    """
+    ultimo_fechado = None if checkpoints is None or checkpoints.empty else checkpoints['mes'].max()
+    particoes = particionar(df, funcionario_padrao)
+    linhas_resumo = []
+    if ultimo_fechado:
+        particoes = [p for p in particoes if p[1] > ultimo_fechado]
+        if COLUNA_FUNCIONARIO not in df.columns:
+            linhas_resumo = resumo_dos_checkpoints(checkpoints, funcionario_padrao)
+    if not particoes and not linhas_resumo:
+        return pd.DataFrame(), {}
+
+    dias_por_funcionario = {}
+    if particoes:
+        workers = workers or os.cpu_count() or 1
+        # Partições mensais são pequenas (~22 linhas): agrupamos várias por envio
+        # para o custo de pickle/IPC não dominar o cálculo.
+        chunksize = max(1, len(particoes) // (workers * 4))
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for funcionario, mes, resumo, df_proc in pool.map(fechar_particao, particoes, chunksize=chunksize):
+                linhas_resumo.append({'funcionario': funcionario, 'mes': mes, **resumo})
+                dias_por_funcionario.setdefault(funcionario, []).append(df_proc)
+
+    colunas = ['funcionario', 'mes', 'saldo', 'extra_casa', 'extra_escritorio',
+               'plantoes', 'total_trabalhado', 'dias_registrados']
+    df_resumo = pd.DataFrame(linhas_resumo)[colunas].sort_values(['funcionario', 'mes'], ignore_index=True)
+    dias = {f: pd.concat(partes, ignore_index=True) for f, partes in dias_por_funcionario.items()}
+    return df_resumo, dias
+
+def exportar_excels(df_resumo: pd.DataFrame, dias: dict, pasta: str, workers: int = None) -> List[str]:
+    os.makedirs(pasta, exist_ok=True)
+    colunas_dias = ['data', 'entrada', 'almoco_ida', 'almoco_volta', 'saida', 'extra_inicio', 'extra_fim',
+                    'horas_escritorio', 'horas_casa', 'total_trabalhado', 'meta_calculada', 'motivo_dia',
+                    'extra_escritorio', 'extra_casa', 'obs']
+    funcionarios = df_resumo['funcionario'].unique()
+    nomes = nomes_de_arquivo(funcionarios)
+    tarefas = []
+    for funcionario in funcionarios:
+        resumo_func = df_resumo[df_resumo['funcionario'] == funcionario].drop(columns=['funcionario'])
+        df_dias = dias.get(funcionario, pd.DataFrame())  # só meses fechados: aba 'Ponto' vazia
+        cols = [c for c in colunas_dias if c in df_dias.columns]
+        tarefas.append((nomes[funcionario], pasta, resumo_func, df_dias[cols]))
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        return list(pool.map(gerar_excel_funcionario, tarefas))
+
+def main():
+    parser = argparse.ArgumentParser(description="Fechamento mensal em lote do banco de horas.")
+    parser.add_argument('--db-url', default=os.environ.get('DATABASE_URL'),
+                        help="URL SQLAlchemy do banco (padrão: $DATABASE_URL).")
+    parser.add_argument('--saida', default='fechamentos', help="Pasta dos arquivos Excel.")
+    parser.add_argument('--workers', type=int, default=None, help="Processos do pool (padrão: nº de CPUs).")
+    parser.add_argument('--funcionario', default=FUNCIONARIO_PADRAO,
+                        help="Nome usado quando a tabela não possui a coluna 'funcionario'.")
+    parser.add_argument('--sem-gravar', action='store_true', help="Não grava a tabela fechamentos_mensais.")
+    args = parser.parse_args()
+
+    if not args.db_url:
+        parser.error("Informe --db-url ou defina DATABASE_URL.")
+
+    engine = arm.criar_engine(args.db_url)
+    arm.init_db(engine)  # garante checkpoints_mensais em bancos que nunca abriram o app
+    inicio = time.perf_counter()
+    checkpoints = fch.checkpoints_ativos(engine)
+    df = arm.carregar_dados(engine)
+
+    df_resumo, dias = executar_fechamento(df, args.workers, args.funcionario, checkpoints)
+    if df_resumo.empty:
+        print("Nenhum registro encontrado.")
+        return
+
+    if not args.sem_gravar:
+        gravar_fechamentos(engine, df_resumo)
+    arquivos = exportar_excels(df_resumo, dias, args.saida, args.workers)
+
+    duracao = time.perf_counter() - inicio
+    print(f"✅ {len(df_resumo)} fechamentos ({len(arquivos)} funcionários) em {duracao:.2f}s")
+    for caminho in arquivos:
+        print(f"   📄 {caminho}")
+
+if __name__ == '__main__':
+    main()
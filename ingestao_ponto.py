@@ -0,0 +1,217 @@
+"""
+Endpoint HTTP de batidas de ponto (terminais de crachá).
+
+Recebe batidas avulsas, consolida por dia em memória e grava em lote
+(ver `core.ingestao`). Só biblioteca padrão no servidor: nada de Streamlit.
+
+Rotas:
+    POST /batidas   corpo JSON (objeto ou lista) ou NDJSON, um evento por linha:
+                    {"tipo": "entrada", "data": "2024-05-02", "hora": "08:03"}
+                    {"tipo": "saida", "momento": "2024-05-02T17:41:10"}
+                    -> 202 {"aceitos": n}; 400 se algum evento for inválido ou o corpo
+                       não for UTF-8 com Content-Length válido; 409 {"fechado_ate",
+                       "dias"} se algum evento cair em mês fechado (nos dois casos
+                       nada do pedido é aceito); 503 se o buffer estiver lotado.
+    GET  /saude     estatísticas do buffer e das descargas.
+
+Uso:
+    python ingestao_ponto.py --db-url postgresql://... --porta 8088
+    python ingestao_ponto.py --carga 200000                 # teste de carga contra SQLite temporário
+    python ingestao_ponto.py --carga 200000 --db-url sqlite:///carga.db --clientes 8 --lote 100
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from core import armazenamento as arm
+from core import ingestao as ing
+
+MAX_CORPO = 1_000_000  # bytes por pedido
+
+# --- SERVIDOR ---
+class ServidorBatidas(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, endereco, buffer: ing.BufferBatidas, descarregador: ing.Descarregador):
+        super().__init__(endereco, ManipuladorBatidas)
+        self.buffer = buffer
+        self.descarregador = descarregador
+
+class ManipuladorBatidas(BaseHTTPRequestHandler):
+    # HTTP/1.1: o terminal reaproveita a conexão (keep-alive) entre envios
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass  # um log por pedido custaria mais que o próprio pedido
+
+    def _responder(self, status: int, corpo: dict):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(dados)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _recusar_corpo(self, motivo: str):
+        # O corpo não foi lido: o que sobrou no socket corromperia o próximo pedido do keep-alive
+        self.close_connection = True
+        raise ing.EventoInvalidoError(motivo)
+
+    def _ler_eventos(self) -> list:
+        try:
+            tamanho = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            self._recusar_corpo("Content-Length inválido.")
+        if tamanho < 0:
+            self._recusar_corpo("Content-Length inválido.")
+        if tamanho > MAX_CORPO:
+            self._recusar_corpo(f"Corpo acima de {MAX_CORPO} bytes.")
+        try:
+            bruto = self.rfile.read(tamanho).decode('utf-8')
+        except UnicodeDecodeError:
+            raise ing.EventoInvalidoError("Corpo não está em UTF-8.")
+        try:
+            carga = json.loads(bruto)
+        except json.JSONDecodeError:
+            try:
+                carga = [json.loads(linha) for linha in bruto.splitlines() if linha.strip()]  # NDJSON
+            except json.JSONDecodeError as e:
+                raise ing.EventoInvalidoError(f"JSON inválido: {e}")
+        return carga if isinstance(carga, list) else [carga]
+
+    def do_POST(self):
+        if self.path != '/batidas':
+            return self._responder(404, {'erro': 'Rota não encontrada.'})
+        try:
+            eventos = [ing.normalizar_evento(ev) for ev in self._ler_eventos()]
+        except ing.EventoInvalidoError as e:
+            return self._responder(400, {'erro': str(e)})
+
+        ultimo_fechado = self.server.descarregador.ultimo_fechado()
+        fechados = ing.dias_em_periodo_fechado(eventos, ultimo_fechado)
+        if fechados:
+            return self._responder(409, {
+                'erro': f"Período fechado até {ultimo_fechado}. Reabra o mês para registrar essas batidas.",
+                'fechado_ate': ultimo_fechado, 'dias': fechados,
+            })
+
+        if not self.server.buffer.adicionar(eventos):
+            return self._responder(503, {'erro': 'Buffer lotado, tente novamente.'})
+        self._responder(202, {'aceitos': len(eventos)})
+
+    def do_GET(self):
+        if self.path != '/saude':
+            return self._responder(404, {'erro': 'Rota não encontrada.'})
+        self._responder(200, {'pendentes': len(self.server.buffer), **self.server.descarregador.estatisticas})
+
+def iniciar_servidor(engine, host: str = '0.0.0.0', porta: int = 8088, intervalo: float = 0.5,
+                     limite_lote: int = 5_000) -> ServidorBatidas:
+    """Sobe buffer + thread de descarga + servidor (ainda sem `serve_forever`)."""
+    buffer = ing.BufferBatidas(limite_lote=limite_lote)
+    descarregador = ing.Descarregador(engine, buffer, intervalo=intervalo)
+    descarregador.start()
+    return ServidorBatidas((host, porta), buffer, descarregador)
+
+# --- TESTE DE CARGA ---
+def _cliente_carga(porta: int, total: int, lote: int, dias: list, falhas: list):
+    conn = http.client.HTTPConnection('127.0.0.1', porta, timeout=30)
+    enviados = 0
+    while enviados < total:
+        n = min(lote, total - enviados)
+        corpo = json.dumps([
+            {'tipo': random.choice(ing.CAMPOS_BATIDA), 'data': random.choice(dias),
+             'hora': f"{random.randint(6, 20):02d}:{random.randint(0, 59):02d}"}
+            for _ in range(n)
+        ])
+        conn.request('POST', '/batidas', corpo, {'Content-Type': 'application/json'})
+        resposta = conn.getresponse()
+        resposta.read()
+        if resposta.status == 503:
+            time.sleep(0.05)  # backpressure: espera a descarga e reenvia o mesmo lote
+            continue
+        if resposta.status not in (202, 409):  # 409: dia sorteado em mês fechado
+            falhas.append(resposta.status)
+        enviados += n
+    conn.close()
+
+def executar_carga(engine, eventos: int, clientes: int, lote: int, dias: int, porta: int = 0) -> dict:
+    """Servidor local + `clientes` threads enviando `eventos` batidas em pedidos de `lote` eventos."""
+    servidor = iniciar_servidor(engine, '127.0.0.1', porta)
+    threading.Thread(target=servidor.serve_forever, name="servidor-batidas", daemon=True).start()
+    porta = servidor.server_address[1]
+
+    inicio_datas = date.today() - timedelta(days=dias)
+    datas = [(inicio_datas + timedelta(days=i)).isoformat() for i in range(dias)]
+    por_cliente = eventos // clientes
+    falhas = []
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=_cliente_carga, args=(porta, por_cliente, lote, datas, falhas))
+               for _ in range(clientes)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    recepcao = time.perf_counter() - inicio
+
+    servidor.shutdown()
+    servidor.descarregador.parar()
+    total = time.perf_counter() - inicio
+    return {
+        **servidor.descarregador.estatisticas,
+        'eventos': por_cliente * clientes, 'recepcao_s': recepcao, 'total_s': total,
+        'eventos_por_s': por_cliente * clientes / recepcao, 'falhas_http': len(falhas),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint HTTP de batidas de ponto.")
+    parser.add_argument('--db-url', default=os.environ.get('DATABASE_URL'),
+                        help="URL SQLAlchemy do banco (padrão: $DATABASE_URL; no modo --carga, SQLite temporário).")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--porta', type=int, default=8088)
+    parser.add_argument('--intervalo', type=float, default=0.5, help="Segundos entre descargas do buffer.")
+    parser.add_argument('--limite-lote', type=int, default=5_000, help="Eventos que antecipam a descarga.")
+    parser.add_argument('--carga', type=int, default=0, metavar='EVENTOS',
+                        help="Roda um teste de carga local com EVENTOS batidas e sai.")
+    parser.add_argument('--clientes', type=int, default=4, help="Conexões simultâneas no teste de carga.")
+    parser.add_argument('--lote', type=int, default=50, help="Eventos por pedido no teste de carga.")
+    parser.add_argument('--dias', type=int, default=365, help="Dias distintos sorteados no teste de carga.")
+    args = parser.parse_args()
+
+    if args.carga:
+        db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'carga_batidas.db')}"
+        engine = arm.criar_engine(db_url)
+        arm.init_db(engine)
+        r = executar_carga(engine, args.carga, args.clientes, args.lote, args.dias)
+        print(f"✅ {r['eventos']} batidas recebidas em {r['recepcao_s']:.2f}s "
+              f"({r['eventos_por_s']:,.0f}/s), gravadas em {r['total_s']:.2f}s")
+        print(f"   {r['descargas']} descargas, {r['dias_gravados']} upserts de dia, "
+              f"{r['ignorados_fechados']} em mês fechado, {r['falhas_http']} falhas HTTP, {r['falhas']} falhas de banco")
+        print(f"   banco: {db_url}")
+        return
+
+    if not args.db_url:
+        parser.error("Informe --db-url ou defina DATABASE_URL.")
+
+    engine = arm.criar_engine(args.db_url)
+    arm.init_db(engine)
+    servidor = iniciar_servidor(engine, args.host, args.porta, args.intervalo, args.limite_lote)
+    print(f"🕒 Recebendo batidas em http://{args.host}:{args.porta}/batidas")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        servidor.descarregador.parar()  # grava o que sobrou no buffer
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Medição de latência contra um Postgres serverless simulado.
+
+Aplica `armazenamento.injetar_latencia` a um SQLite temporário (ou ao banco
+de --db-url) para reproduzir, sem depender do Neon:
+
+  aquecimento  primeira consulta com o pool frio, com e sem `aquecer` antes
+               (cada conexão nova paga --latencia-conexao)
+  rerun        as consultas de um rerun do app, em sequência (como antes do
+               pool de threads) e disparadas juntas por `core.consultas.disparar`,
+               com a versão ainda fora do cache de livros e já dentro dele
+
+Uso:
+    python medir_latencia.py                                   # 100 ms por consulta, 500 ms por conexão
+    python medir_latencia.py --latencia-consulta 0.05 --dias 730 --repeticoes 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from core import armazenamento as arm
+from core import consultas as cns
+from core import fechamento as fch
+from core import ingestao as ing
+from core.livro import RepositorioLivros
+
+def _popular(engine, dias: int):
+    """Um ano (ou `dias`) de jornadas comuns, gravado em lote."""
+    hoje = date.today()
+    lote = {(hoje - timedelta(days=i)).isoformat(): {'entrada': '09:00:00', 'almoco_ida': '12:00:00',
+                                                     'almoco_volta': '13:00:00', 'saida': '18:00:00'}
+            for i in range(1, dias + 1)}
+    ing.gravar_lote(engine, lote)
+
+def _cronometrar(funcao) -> float:
+    inicio = time.perf_counter()
+    funcao()
+    return time.perf_counter() - inicio
+
+# --- CENÁRIOS ---
+def medir_aquecimento(db_url: str, por_consulta: float, por_conexao: float) -> dict:
+    """Primeira consulta num engine novo: fria vs. depois de `aquecer` (que roda antes da senha no app)."""
+    def primeira_consulta(aquecido: bool) -> float:
+        engine = arm.injetar_latencia(arm.criar_engine(db_url), por_consulta, por_conexao)
+        if aquecido:
+            arm.aquecer(engine)
+        duracao = _cronometrar(lambda: arm.versao_dados(engine))
+        engine.dispose()
+        return duracao
+    return {'fria_s': primeira_consulta(False), 'aquecida_s': primeira_consulta(True)}
+
+def medir_rerun(engine, repeticoes: int) -> dict:
+    """Mediana de `repeticoes` reruns em cada modo (conexões já aquecidas)."""
+    def sequencial():
+        # Mesmas consultas, uma depois da outra
+        arm.versao_dados(engine)
+        arm.carregar_dados(engine)
+        fch.acumulado_fechado(engine)
+        arm.buscar_logs(engine)
+        fch.meses_para_fechar(engine)
+        fch.meses_fechados(engine)
+
+    def concorrente(repositorio):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            for futuro in cns.disparar(pool, engine, repositorio).values():
+                futuro.result()
+
+    repositorio_quente = RepositorioLivros()
+    concorrente(repositorio_quente)  # versão atual já no cache para o último modo
+    return {
+        'sequencial_s': statistics.median(_cronometrar(sequencial) for _ in range(repeticoes)),
+        'concorrente_s': statistics.median(_cronometrar(lambda: concorrente(RepositorioLivros()))
+                                           for _ in range(repeticoes)),
+        'concorrente_cache_s': statistics.median(_cronometrar(lambda: concorrente(repositorio_quente))
+                                                 for _ in range(repeticoes)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência do app contra um banco serverless simulado.")
+    parser.add_argument('--db-url', default=None, help="URL SQLAlchemy (padrão: SQLite temporário populado).")
+    parser.add_argument('--latencia-consulta', type=float, default=0.1, help="Segundos somados a cada consulta.")
+    parser.add_argument('--latencia-conexao', type=float, default=0.5,
+                        help="Segundos somados a cada conexão nova (cold start).")
+    parser.add_argument('--dias', type=int, default=365, help="Dias gravados no SQLite temporário.")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    db_url = args.db_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'latencia.db')}"
+    engine = arm.criar_engine(db_url)
+    arm.init_db(engine)
+    if not args.db_url:
+        _popular(engine, args.dias)
+    engine.dispose()
+
+    a = medir_aquecimento(db_url, args.latencia_consulta, args.latencia_conexao)
+    print(f"🔌 primeira consulta: {a['fria_s']:.2f}s com o banco frio, {a['aquecida_s']:.2f}s depois de aquecer")
+
+    engine = arm.injetar_latencia(arm.criar_engine(db_url), args.latencia_consulta, args.latencia_conexao)
+    arm.aquecer(engine, conexoes=5)
+    r = medir_rerun(engine, args.repeticoes)
+    print(f"🔁 rerun: {r['sequencial_s']:.2f}s em sequência, {r['concorrente_s']:.2f}s concorrente, "
+          f"{r['concorrente_cache_s']:.2f}s concorrente com o livro em cache")
+    print(f"   latência: {args.latencia_consulta * 1000:.0f} ms/consulta, {args.latencia_conexao * 1000:.0f} ms/conexão")
+    print(f"   banco: {db_url}")
+
+    sys.exit(0 if r['concorrente_s'] < r['sequencial_s'] else 1)
+
+if __name__ == '__main__':
+    main()
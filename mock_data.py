@@ -1,7 +1,6 @@
 import pandas as pd
 import random
 from datetime import date, datetime as dt, timedelta
-import holidays
 
 def gerar_dados_ficticios(cenario="superavit"):
     """
@@ -16,6 +15,7 @@ def gerar_dados_ficticios(cenario="superavit"):
     dados = []
     
     # Calendário de Feriados para referência (pra garantir que vamos trabalhar neles)
+    import holidays  # import pesado: só quando o cenário é gerado
     br_holidays = holidays.BR(subdiv='SP')
     
     for d in datas: